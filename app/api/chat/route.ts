@@ -1,41 +1,117 @@
 import { streamText } from 'ai';
-import { Configuration, OpenAIApi } from 'openai-edge';
-import { openai } from '@ai-sdk/openai';
+import { createOpenAI, openai } from '@ai-sdk/openai';
+import { z } from 'zod';
+import { estimateTokens } from '@/lib/ai/tokens';
 
-// Create an OpenAI API client (that's edge friendly!)
-const config = new Configuration({
-  apiKey: process.env.OPENAI_API_KEY || '',
+export const runtime = 'edge';
+
+// Shape of the body sent by useChat on the chat page; unknown message fields
+// (ids, timestamps) are stripped during parsing
+const chatRequestSchema = z.object({
+  messages: z.array(z.object({
+    role: z.enum(['user', 'assistant', 'system']),
+    content: z.string(),
+  })).min(1),
+  fileIds: z.array(z.string().uuid()).default([]),
+  model: z.string().default('gpt-4o'),
+  temperature: z.number().min(0).max(2).default(0.7),
+  maxTokens: z.number().int().positive().default(4096),
+  apiKey: z.string().min(1).optional(),
 });
-const openaiApi = new OpenAIApi(config);
 
-export const runtime = 'edge';
+const CHAT_SYSTEM_PROMPT = 'You are an AI assistant specialized in helping users with PDF documents. You can analyze content, extract information, and answer questions about documents.';
+
+// Input token budget for the conversation sent to the model. Long chats
+// otherwise resend their entire history on every message, which raises both
+// latency and cost and can overflow the model's context window.
+const MAX_HISTORY_TOKENS = 8000;
+
+type ChatMessage = z.infer<typeof chatRequestSchema>['messages'][number];
+
+/**
+ * Keeps the most recent messages that fit in the token budget. The latest
+ * message is always kept, even when it is over budget on its own.
+ */
+function fitMessagesToBudget(messages: ChatMessage[], budget: number): ChatMessage[] {
+  let total = 0;
+  let start = messages.length;
+  while (start > 0) {
+    const tokens = estimateTokens(messages[start - 1].content);
+    if (start < messages.length && total + tokens > budget) break;
+    total += tokens;
+    start--;
+  }
+  return messages.slice(start);
+}
+
+// Providers for user-supplied API keys, reused across requests so each key
+// gets one client instead of a new one per message. The map is keyed by a
+// hash of the API key so raw secrets are not kept around as map keys.
+const MAX_CACHED_PROVIDERS = 64;
+const providersByKeyHash = new Map<string, ReturnType<typeof createOpenAI>>();
+
+/**
+ * Hex SHA-256 of an API key, via Web Crypto so it works on the edge runtime
+ */
+async function hashApiKey(apiKey: string): Promise<string> {
+  const digest = await crypto.subtle.digest('SHA-256', new TextEncoder().encode(apiKey));
+  return Array.from(new Uint8Array(digest), byte => byte.toString(16).padStart(2, '0')).join('');
+}
+
+/**
+ * Returns the OpenAI provider for a request: the key from the user's settings
+ * when one is sent, otherwise the server's OPENAI_API_KEY
+ */
+async function getOpenAIProvider(apiKey?: string) {
+  if (!apiKey) return openai;
+
+  const keyHash = await hashApiKey(apiKey);
+  let provider = providersByKeyHash.get(keyHash);
+  if (!provider) {
+    if (providersByKeyHash.size >= MAX_CACHED_PROVIDERS) {
+      const oldestKeyHash = providersByKeyHash.keys().next().value;
+      if (oldestKeyHash !== undefined) providersByKeyHash.delete(oldestKeyHash);
+    }
+    provider = createOpenAI({ apiKey });
+    providersByKeyHash.set(keyHash, provider);
+  }
+  return provider;
+}
 
 export async function POST(req: Request) {
   try {
-    const { messages, fileIds, model = 'gpt-4o', temperature = 0.7, maxTokens = 4096 } = await req.json();
-    
-    // Add system message for context
-    let systemContent = 'You are an AI assistant specialized in helping users with PDF documents. You can analyze content, extract information, and answer questions about documents.';
-
-    // If fileIds exist, add a mention of them
-    if (fileIds && fileIds.length > 0) {
-      systemContent += ` The user has attached ${fileIds.length} PDF document(s). Please help analyze these documents based on the user's questions.`;
+    // A body that isn't JSON fails validation below rather than surfacing as a 500
+    const parsed = chatRequestSchema.safeParse(await req.json().catch(() => null));
+    if (!parsed.success) {
+      return new Response(JSON.stringify({ error: 'Invalid chat request', issues: parsed.error.issues }), {
+        status: 400,
+        headers: { 'Content-Type': 'application/json' }
+      });
     }
+    const { messages, fileIds, model, temperature, maxTokens, apiKey } = parsed.data;
+    
+    // Add system message for context, mentioning any attached files
+    const systemContent = fileIds.length > 0
+      ? `${CHAT_SYSTEM_PROMPT} The user has attached ${fileIds.length} PDF document(s). Please help analyze these documents based on the user's questions.`
+      : CHAT_SYSTEM_PROMPT;
 
     // Use the model from settings, fallback to gpt-4o
     const response = streamText({
-      model: openai(model),
+      model: (await getOpenAIProvider(apiKey))(model),
       system: systemContent,
-      messages: messages.map((msg: any) => ({
-        role: msg.role,
-        content: msg.content,
-      })),
+      messages: fitMessagesToBudget(messages, MAX_HISTORY_TOKENS - estimateTokens(systemContent)),
       maxTokens: maxTokens,
       temperature: temperature,
     });
 
-    // Return the streaming response
-    return response.toDataStreamResponse();
+    // Return the streaming response; tell proxies not to buffer or transform
+    // it so tokens reach the client as they are generated
+    return response.toDataStreamResponse({
+      headers: {
+        'Cache-Control': 'no-cache, no-transform',
+        'X-Accel-Buffering': 'no',
+      },
+    });
   } catch (error) {
     console.error('Error in chat API:', error);
     return new Response(JSON.stringify({ error: 'Failed to process your request' }), {
@@ -1,26 +1,79 @@
 import { NextRequest, NextResponse } from "next/server";
-import { getPdfMetadata, savePdfMetadata, getFileById } from "@/lib/db";
+import { getPdfMetadata, savePdfMetadata, getFileById, PdfMetadata } from "@/lib/db";
 import { enhanceMetadataWithGemini } from "@/lib/ai/gemini";
+import { extractPdfInWorker } from "@/lib/pdf/extraction";
+import { UPLOADS_DIR } from "@/lib/storage";
 import fs from "fs";
 import path from "path";
+import { z } from "zod";
+import { debugLog } from "@/lib/debug";
+import { fromPdfMetadataRecord, toPdfMetadataRecord } from "@/lib/pdf/metadata";
+
+const enhanceMetadataRequestSchema = z.object({
+  fileId: z.string().uuid(),
+});
+
+// Enhancements currently running, keyed by file ID
+const inflightEnhancements = new Map<string, Promise<PdfMetadata | undefined>>();
+
+/**
+ * Re-extracts a stored PDF, enhances its metadata with Gemini and saves the
+ * result
+ */
+async function enhanceStoredMetadata(
+  fileId: string,
+  metadata: PdfMetadata,
+  filePath: string
+): Promise<PdfMetadata | undefined> {
+  // Extract text from PDF
+  debugLog("Extracting PDF text...");
+  const extractionResult = await extractPdfInWorker(filePath);
+  debugLog(`Text extraction complete, text length: ${extractionResult.fullText.length}`);
+  const { fullText, pageTexts } = extractionResult;
+
+  // Convert DB metadata to the format expected by enhanceMetadataWithGemini
+  const metadataForEnhancement = fromPdfMetadataRecord(metadata);
+
+  // Enhance metadata with Gemini
+  debugLog("Calling Gemini API...");
+  const enhancedMetadata = await enhanceMetadataWithGemini(
+    metadataForEnhancement,
+    fullText,
+    filePath,
+    pageTexts
+  );
+  debugLog("Gemini API response received");
+  debugLog("Enhanced metadata from Gemini:", () => JSON.stringify(enhancedMetadata, null, 2));
+
+  // Save enhanced metadata back to database
+  debugLog("Saving enhanced metadata to database");
+  
+  // Ensure all values are of the correct type for SQLite
+  const sanitizedMetadata = toPdfMetadataRecord(fileId, enhancedMetadata);
+  
+  debugLog("Sanitized metadata:", () => JSON.stringify(sanitizedMetadata, null, 2));
+  return savePdfMetadata(sanitizedMetadata);
+}
 
 export async function POST(request: NextRequest) {
   try {
-    console.log("Enhance metadata API called");
-    const data = await request.json();
-    const { fileId } = data;
-    console.log("File ID:", fileId);
+    debugLog("Enhance metadata API called");
+    // A body that isn't JSON fails validation below rather than surfacing as a 500
+    const parsed = enhanceMetadataRequestSchema.safeParse(await request.json().catch(() => null));
 
-    if (!fileId) {
+    if (!parsed.success) {
       return NextResponse.json(
-        { error: "File ID is required" },
+        { error: "A valid file ID is required" },
         { status: 400 }
       );
     }
 
+    const { fileId } = parsed.data;
+    debugLog(`File ID: ${fileId}`);
+
     // Get current metadata
     const metadata = getPdfMetadata(fileId);
-    console.log("Retrieved metadata:", metadata ? "Found" : "Not found");
+    debugLog(`Retrieved metadata: ${metadata ? "Found" : "Not found"}`);
     if (!metadata) {
       return NextResponse.json(
         { error: "Metadata not found for this file" },
@@ -30,7 +83,8 @@ export async function POST(request: NextRequest) {
 
     // Get the file record to get the actual filename
     const fileRecord = getFileById(fileId);
-    console.log("File record:", fileRecord ? "Found" : "Not found", fileRecord);
+    debugLog(`File record: ${fileRecord ? "Found" : "Not found"}`);
+    debugLog("File record details:", () => fileRecord);
     if (!fileRecord) {
       return NextResponse.json(
         { error: "File record not found" },
@@ -39,86 +93,28 @@ export async function POST(request: NextRequest) {
     }
 
     // Get file path to extract text
-    const uploadsDir = path.join(process.cwd(), "uploads");
-    const filePath = path.join(uploadsDir, fileRecord.filename);
-    console.log("File path:", filePath);
+    const filePath = path.join(UPLOADS_DIR, fileRecord.filename);
+    debugLog(`File path: ${filePath}`);
 
-    if (!fs.existsSync(filePath)) {
-      console.log("PDF file not found at path:", filePath);
+    const fileExists = await fs.promises.access(filePath).then(() => true, () => false);
+    if (!fileExists) {
+      console.error("PDF file not found at path:", filePath);
       return NextResponse.json(
         { error: "PDF file not found" },
         { status: 404 }
       );
     }
 
-    // Read file content
-    const fileBuffer = fs.readFileSync(filePath);
-    const fileData = new Uint8Array(fileBuffer);
-
-    // Extract text from PDF
-    const { extractPdfMetadata } = await import("@/lib/pdf/mupdf-parser.mjs");
-    console.log("Extracting PDF text...");
-    const extractionResult = await extractPdfMetadata(filePath);
-    console.log("Text extraction complete, text length:", extractionResult.fullText.length);
-    const { fullText } = extractionResult;
-
-    // Convert DB metadata to the format expected by enhanceMetadataWithGemini
-    const metadataForEnhancement = {
-      title: metadata.title || "",
-      author: metadata.author || "",
-      subject: metadata.subject || "",
-      keywords: metadata.keywords || "",
-      creator: metadata.creator || "",
-      producer: metadata.producer || "",
-      pageCount: metadata.page_count || 0,
-      creationDate: metadata.creation_date || "",
-      modificationDate: metadata.modification_date || "",
-      summary: metadata.summary || "",
-      documentType: metadata.document_type || "",
-      topics: metadata.topics ? metadata.topics.split(",").map(t => t.trim()) : [],
-      aiEnhanced: Boolean(metadata.ai_enhanced),
-      needsReview: Boolean(metadata.needs_review)
-    };
-
-    // Enhance metadata with Gemini
-    console.log("Calling Gemini API...");
-    const enhancedMetadata = await enhanceMetadataWithGemini(
-      metadataForEnhancement,
-      fullText,
-      filePath
-    );
-    console.log("Gemini API response received");
-    console.log("Enhanced metadata from Gemini:", JSON.stringify(enhancedMetadata, null, 2));
-
-    // Save enhanced metadata back to database
-    console.log("Saving enhanced metadata to database");
-    
-    // Ensure all values are of the correct type for SQLite
-    const sanitizedMetadata = {
-      fileId,
-      title: String(enhancedMetadata.title || ''),
-      author: String(enhancedMetadata.author || ''),
-      subject: String(enhancedMetadata.subject || ''),
-      keywords: String(enhancedMetadata.keywords || ''),
-      creator: String(enhancedMetadata.creator || ''),
-      producer: String(enhancedMetadata.producer || ''),
-      pageCount: Number(enhancedMetadata.pageCount || 0),
-      creationDate: String(enhancedMetadata.creationDate || ''),
-      modificationDate: String(enhancedMetadata.modificationDate || ''),
-      summary: String(enhancedMetadata.summary || ''),
-      documentType: String(enhancedMetadata.documentType || ''),
-      // Convert topics array to string
-      topics: Array.isArray(enhancedMetadata.topics) 
-        ? enhancedMetadata.topics.join(", ") 
-        : String(enhancedMetadata.topics || ''),
-      // Keep as boolean values - the savePdfMetadata function will handle conversion to SQLite integers
-      aiEnhanced: Boolean(enhancedMetadata.aiEnhanced),
-      needsReview: Boolean(enhancedMetadata.needsReview)
-    };
-    
-    console.log("Sanitized metadata:", JSON.stringify(sanitizedMetadata, null, 2));
-    const updatedMetadata = await savePdfMetadata(sanitizedMetadata);
-    console.log("Metadata successfully enhanced and saved");
+    // Concurrent requests for the same file share one enhancement run
+    // instead of each re-running extraction and the Gemini call
+    let enhancement = inflightEnhancements.get(fileId);
+    if (!enhancement) {
+      enhancement = enhanceStoredMetadata(fileId, metadata, filePath)
+        .finally(() => inflightEnhancements.delete(fileId));
+      inflightEnhancements.set(fileId, enhancement);
+    }
+    const updatedMetadata = await enhancement;
+    debugLog("Metadata successfully enhanced and saved");
     return NextResponse.json({ 
       success: true, 
       metadata: updatedMetadata 
@@ -1,5 +1,6 @@
 import { NextRequest, NextResponse } from "next/server";
-import { getFileById } from "@/lib/db";
+import { getFileWithMetadata } from "@/lib/db";
+import { validate as isUuid } from "uuid";
 
 export async function GET(
   request: NextRequest,
@@ -7,7 +8,16 @@ export async function GET(
 ) {
   try {
     const id = params.id;
-    const file = getFileById(id);
+
+    if (!isUuid(id)) {
+      return NextResponse.json(
+        { error: "Invalid file ID" },
+        { status: 400 }
+      );
+    }
+
+    // Served from the file detail cache on repeat requests
+    const file = getFileWithMetadata(id)?.file;
 
     if (!file) {
       return NextResponse.json(
@@ -1,30 +1,58 @@
 import { NextRequest, NextResponse } from "next/server";
-import { getAllFiles, getFileById, deleteFile } from "@/lib/db";
+import { listFiles, getFileWithMetadata, deleteFiles } from "@/lib/db";
+import { UPLOADS_DIR } from "@/lib/storage";
+import { validate as isUuid } from "uuid";
 import fs from "fs";
 import path from "path";
 
+// The db helpers return the same cached objects until the underlying rows
+// change, so remember each object's JSON and skip re-serializing it on hits
+const serializedResults = new WeakMap<object, string>();
+
+function cachedJsonResponse(result: object) {
+  let body = serializedResults.get(result);
+  if (body === undefined) {
+    body = JSON.stringify(result);
+    serializedResults.set(result, body);
+  }
+  return new NextResponse(body, {
+    headers: { "Content-Type": "application/json" },
+  });
+}
+
 export async function GET(request: NextRequest) {
   try {
     const searchParams = request.nextUrl.searchParams;
     const id = searchParams.get("id");
 
     if (id) {
-      // Get a specific file
-      const file = getFileById(id);
+      if (!isUuid(id)) {
+        return NextResponse.json(
+          { error: "Invalid file ID" },
+          { status: 400 }
+        );
+      }
+
+      // Get a specific file along with its PDF metadata
+      const result = getFileWithMetadata(id);
       
-      if (!file) {
+      if (!result) {
         return NextResponse.json(
           { error: "File not found" },
           { status: 404 }
         );
       }
       
-      return NextResponse.json({ file });
+      return cachedJsonResponse(result);
     }
     
-    // Get all files
-    const files = getAllFiles();
-    return NextResponse.json({ files });
+    // Get one page of files
+    const limit = parseInt(searchParams.get("limit") || "", 10);
+    const page = listFiles({
+      limit: isNaN(limit) ? undefined : limit,
+      cursor: searchParams.get("cursor") || undefined,
+    });
+    return cachedJsonResponse(page);
   } catch (error) {
     console.error("Error fetching files:", error);
     return NextResponse.json(
@@ -37,38 +65,42 @@ export async function GET(request: NextRequest) {
 export async function DELETE(request: NextRequest) {
   try {
     const searchParams = request.nextUrl.searchParams;
-    const id = searchParams.get("id");
+    // One or more ids, e.g. ?id=a&id=b
+    const ids = searchParams.getAll("id");
 
-    if (!id) {
+    if (ids.length === 0) {
       return NextResponse.json(
         { error: "File ID is required" },
         { status: 400 }
       );
     }
 
-    // Get file details before deletion
-    const file = getFileById(id);
+    if (!ids.every((id) => isUuid(id))) {
+      return NextResponse.json(
+        { error: "Invalid file ID" },
+        { status: 400 }
+      );
+    }
+
+    // Delete the files from the database, getting the deleted rows back
+    const files = deleteFiles(ids);
     
-    if (!file) {
+    if (files.length === 0) {
       return NextResponse.json(
         { error: "File not found" },
         { status: 404 }
       );
     }
 
-    // Delete the file from the database
-    deleteFile(id);
-
-    // Delete the physical file
-    const filePath = path.join(process.cwd(), file.path.replace(/^\//, ''));
-    
-    if (fs.existsSync(filePath)) {
-      fs.unlinkSync(filePath);
-    }
+    // Delete the physical files; some may already be gone
+    await Promise.all(
+      files.map((file) => fs.promises.rm(path.join(UPLOADS_DIR, file.filename), { force: true }))
+    );
 
     return NextResponse.json({ 
       success: true,
-      message: "File deleted successfully" 
+      deleted: files.length,
+      message: files.length === 1 ? "File deleted successfully" : `${files.length} files deleted successfully`
     });
   } catch (error) {
     console.error("Error deleting file:", error);
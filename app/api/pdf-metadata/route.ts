@@ -1,5 +1,6 @@
 import { NextRequest, NextResponse } from "next/server";
-import { getPdfMetadata } from "@/lib/db";
+import { getFileWithMetadata } from "@/lib/db";
+import { validate as isUuid } from "uuid";
 
 export async function GET(request: NextRequest) {
   try {
@@ -12,9 +13,16 @@ export async function GET(request: NextRequest) {
         { status: 400 }
       );
     }
+
+    if (!isUuid(fileId)) {
+      return NextResponse.json(
+        { error: "Invalid file ID" },
+        { status: 400 }
+      );
+    }
     
-    // Get PDF metadata
-    const metadata = getPdfMetadata(fileId);
+    // Get PDF metadata; served from the file detail cache on repeat requests
+    const metadata = getFileWithMetadata(fileId)?.metadata;
     
     if (!metadata) {
       return NextResponse.json(
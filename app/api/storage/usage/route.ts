@@ -1,20 +1,20 @@
 import { NextResponse } from 'next/server';
+import { getStorageUsage } from '@/lib/db';
 
-export const runtime = 'edge';
+// Storage quota shown on the settings page
+const STORAGE_QUOTA_BYTES = 100 * 1024 * 1024;
 
 export async function GET() {
   try {
-    // In a real implementation, you would calculate actual storage usage
-    // For now, we'll return mock data
-    // This could be enhanced to check IndexedDB or localStorage size
+    // Upload sizes are recorded with each file, so usage is one aggregate
+    // query instead of a scan of the uploads directory
+    const { used, fileCount } = getStorageUsage();
     
-    // Mock data for demonstration
-    const mockUsage = {
-      used: 25 * 1024 * 1024, // 25MB in bytes
-      total: 100 * 1024 * 1024, // 100MB in bytes
-    };
-    
-    return NextResponse.json(mockUsage);
+    return NextResponse.json({
+      used,
+      total: STORAGE_QUOTA_BYTES,
+      fileCount,
+    });
   } catch (error) {
     console.error('Error getting storage usage:', error);
     return NextResponse.json(
@@ -1,96 +1,144 @@
 import { NextRequest, NextResponse } from "next/server";
-import { createFile, savePdfMetadata, FileRecord } from "@/lib/db";
-import path from "path";
+import { createFile, getFileByContentHash, updateFile, FileRecord } from "@/lib/db";
 import fs from "fs";
+import path from "path";
 import { v4 as uuidv4 } from "uuid";
 import { isValidPdf } from "@/lib/utils";
-import { PDFDocument } from 'pdf-lib';
+import { UPLOADS_DIR, InvalidPdfError, saveUploadedFile } from "@/lib/storage";
 
 // Import the new processor
 import { processPdf } from '@/lib/pdf/processor';
-import { addEnhancedMetadataFields } from '../../../lib/db/migrations/add_enhanced_metadata';
 
-// Ensure uploads directory exists
-const UPLOADS_DIR = path.join(process.cwd(), "uploads");
-if (!fs.existsSync(UPLOADS_DIR)) {
-  fs.mkdirSync(UPLOADS_DIR, { recursive: true });
+/**
+ * Runs the PDF pipeline for a new upload after the response has been sent,
+ * recording the outcome in the file's status
+ */
+function processInBackground(fileId: string, filePath: string) {
+  console.log(`Starting PDF processing for file: ${fileId}`);
+  processPdf(fileId, filePath)
+    .then(() => {
+      updateFile(fileId, { status: "ready" });
+      console.log(`PDF processing completed successfully for file: ${fileId}`);
+    })
+    .catch((processingError) => {
+      console.error(`Error in PDF processing for file ${fileId}:`, processingError);
+      updateFile(fileId, { status: "failed" });
+    });
 }
 
 export async function POST(request: NextRequest) {
   try {
-    const formData = await request.formData();
-    const file = formData.get("file") as File | null;
+    let body: ReadableStream<Uint8Array> | null;
+    let originalFilename: string;
 
-    if (!file) {
-      return NextResponse.json(
-        { error: "No file provided" },
-        { status: 400 }
-      );
+    if (request.headers.get("content-type")?.startsWith("application/pdf")) {
+      // Raw PDF body: stream it straight from the socket to disk
+      body = request.body;
+      try {
+        originalFilename = decodeURIComponent(request.headers.get("x-filename") || "document.pdf");
+      } catch {
+        // Malformed percent-encoding in the client-supplied name
+        return NextResponse.json(
+          { error: "Invalid X-Filename header" },
+          { status: 400 }
+        );
+      }
+    } else {
+      // Multipart form upload; formData() buffers the whole file in memory
+      const formData = await request.formData();
+      const file = formData.get("file") as File | null;
+
+      if (!file) {
+        return NextResponse.json(
+          { error: "No file provided" },
+          { status: 400 }
+        );
+      }
+
+      // Validate file is a PDF
+      if (!isValidPdf(file)) {
+        return NextResponse.json(
+          { error: "Only PDF files are allowed" },
+          { status: 400 }
+        );
+      }
+
+      body = file.stream();
+      originalFilename = file.name;
     }
 
-    // Validate file is a PDF
-    if (!isValidPdf(file)) {
+    if (!body) {
       return NextResponse.json(
-        { error: "Only PDF files are allowed" },
+        { error: "No file provided" },
         { status: 400 }
       );
     }
 
-    // Create a unique filename
+    // Create a unique filename. The content must pass the PDF header check,
+    // so the extension is fixed rather than taken from the client's name
     const uniqueId = uuidv4();
-    const fileExtension = path.extname(file.name);
-    const filename = `${uniqueId}${fileExtension}`;
+    const filename = `${uniqueId}.pdf`;
     const filePath = path.join(UPLOADS_DIR, filename);
 
-    // Convert file to ArrayBuffer
-    const buffer = await file.arrayBuffer();
-    
-    // Write file to disk
-    fs.writeFileSync(filePath, Buffer.from(buffer));
+    // Stream file to a temporary name, hashing it on the way; it only
+    // becomes a real upload once we know it isn't a duplicate
+    const tempPath = `${filePath}.part`;
+    const { contentHash, size } = await saveUploadedFile(body, tempPath);
+
+    // Skip parsing entirely if this exact PDF was uploaded before
+    const existing = getFileByContentHash(contentHash);
+    if (existing) {
+      await fs.promises.rm(tempPath, { force: true });
+      console.log(`Duplicate upload of file: ${existing.file.id}`);
+
+      const { file: existingFile, metadata: existingMetadata, chunkCount } = existing;
+      return NextResponse.json({ 
+        success: true, 
+        duplicate: true,
+        file: existingFile,
+        chunkCount,
+        metadata: existingMetadata ? {
+          title: existingMetadata.title || existingFile.original_filename,
+          author: existingMetadata.author,
+          pageCount: existingMetadata.page_count,
+          summary: existingMetadata.summary,
+          documentType: existingMetadata.document_type,
+          topics: existingMetadata.topics,
+          aiEnhanced: Boolean(existingMetadata.ai_enhanced),
+          needsReview: Boolean(existingMetadata.needs_review)
+        } : undefined
+      });
+    }
+
+    await fs.promises.rename(tempPath, filePath);
 
-    // Ensure the database has the required fields
-    addEnhancedMetadataFields();
-    
     // Save file metadata to database
     const savedFile = createFile({
       filename,
-      originalFilename: file.name,
-      size: file.size,
+      originalFilename,
+      size,
       path: `/api/uploads/${filename}`,
-      mimetype: file.type,
+      mimetype: "application/pdf",
+      contentHash,
+      status: "processing",
     }) as FileRecord;
     
-    // Process the PDF with our new processor
-    try {
-      console.log(`Starting PDF processing for file: ${savedFile.id}`);
-      const metadata = await processPdf(savedFile.id, filePath);
-      console.log(`PDF processing completed successfully for file: ${savedFile.id}`);
-      
-      return NextResponse.json({ 
-        success: true, 
-        file: savedFile,
-        metadata: {
-          title: metadata.title || file.name,
-          author: metadata.author,
-          pageCount: metadata.pageCount,
-          summary: metadata.summary,
-          documentType: metadata.documentType,
-          topics: metadata.topics,
-          aiEnhanced: metadata.aiEnhanced,
-          needsReview: metadata.needsReview
-        }
-      });
-    } catch (processingError) {
-      console.error('Error in PDF processing:', processingError);
-      
-      // Still return success since the file was uploaded, but indicate processing error
-      return NextResponse.json({ 
-        success: true, 
-        file: savedFile,
-        processingError: 'Failed to extract metadata from PDF. The file was uploaded successfully, but metadata extraction failed.'
-      });
-    }
+    // Parse and enhance the PDF in the background; the client gets the file
+    // record right away and sees its status change from processing to ready
+    processInBackground(savedFile.id, filePath);
+
+    return NextResponse.json(
+      { success: true, processing: true, file: savedFile },
+      { status: 202 }
+    );
   } catch (error) {
+    if (error instanceof InvalidPdfError) {
+      return NextResponse.json(
+        { error: "Only PDF files are allowed" },
+        { status: 400 }
+      );
+    }
+
     console.error("Error uploading file:", error);
     return NextResponse.json(
       { error: "Failed to upload file" },
@@ -1,6 +1,11 @@
 import { NextRequest, NextResponse } from "next/server";
 import path from "path";
 import fs from "fs";
+import { UPLOADS_DIR } from "@/lib/storage";
+import { debugLog } from "@/lib/debug";
+
+// Stored uploads are named <uuid><extension> by the upload route
+const STORED_FILENAME = /^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}(\.[A-Za-z0-9]+)?$/i;
 
 export async function GET(
   request: NextRequest,
@@ -8,37 +13,36 @@ export async function GET(
 ) {
   try {
     const filename = params.filename;
-    console.log(`Serving file: ${filename}`);
+    debugLog(`Serving file: ${filename}`);
     
-    // Prevent path traversal attacks
-    if (filename.includes('..')) {
-      console.error(`Path traversal attempt detected: ${filename}`);
+    // Only names the upload route generates are served, which also rules out
+    // path traversal before the filesystem is touched
+    if (!STORED_FILENAME.test(filename)) {
+      console.error(`Invalid filename requested: ${filename}`);
       return NextResponse.json(
         { error: "Invalid filename" },
         { status: 400 }
       );
     }
     
-    const filePath = path.join(process.cwd(), "uploads", filename);
-    console.log(`Full file path: ${filePath}`);
+    const filePath = path.join(UPLOADS_DIR, filename);
+    debugLog(`Full file path: ${filePath}`);
     
-    // Check if file exists
-    if (!fs.existsSync(filePath)) {
+    // Get file stats; a missing file is a 404 rather than a second lookup
+    const stats = await fs.promises.stat(filePath).catch(() => null);
+    if (!stats) {
       console.error(`File not found: ${filePath}`);
       return NextResponse.json(
         { error: "File not found" },
         { status: 404 }
       );
     }
-    
-    // Get file stats
-    const stats = fs.statSync(filePath);
-    console.log(`File size: ${stats.size} bytes`);
+    debugLog(`File size: ${stats.size} bytes`);
     
     // Read file content
-    const fileBuffer = fs.readFileSync(filePath);
+    const fileBuffer = await fs.promises.readFile(filePath);
     
-    console.log(`Successfully serving file: ${filename} (${fileBuffer.length} bytes)`);
+    debugLog(`Successfully serving file: ${filename} (${fileBuffer.length} bytes)`);
     
     // Return file with proper content type
     return new NextResponse(fileBuffer, {
@@ -46,7 +50,7 @@ export async function GET(
         "Content-Type": "application/pdf",
         "Content-Disposition": `inline; filename="${filename}"`,
         "Content-Length": String(fileBuffer.length),
-        "Cache-Control": "public, max-age=31536000",
+        "Cache-Control": "public, max-age=31536000, no-transform",
       },
     });
   } catch (error) {
@@ -24,6 +24,7 @@ export default function ChatPage() {
   const [availableFiles, setAvailableFiles] = useState<FileAttachment[]>([]);
   const [isLoadingFiles, setIsLoadingFiles] = useState(false);
   const [aiModel, setAiModel] = useState("GPT-4o");
+  const [apiKey, setApiKey] = useState<string | undefined>(undefined);
   const textAreaRef = useRef<HTMLTextAreaElement>(null);
 
   // Load AI model from settings
@@ -39,6 +40,9 @@ export default function ChatPage() {
           "gpt-3.5-turbo": "GPT-3.5 Turbo"
         };
         setAiModel(modelDisplayNames[savedModel] || "GPT-4o");
+
+        // Use the API key saved in settings, if any, instead of the server's
+        setApiKey(localStorage.getItem("openai_api_key") || undefined);
       } catch (error) {
         console.error("Error loading AI model setting:", error);
       }
@@ -52,6 +56,7 @@ export default function ChatPage() {
     api: '/api/chat',
     body: {
       fileIds: attachedFiles.map(file => file.id),
+      apiKey,
     },
   });
 
@@ -59,21 +64,26 @@ export default function ChatPage() {
   const fetchAvailableFiles = async () => {
     setIsLoadingFiles(true);
     try {
-      const response = await fetch("/api/files");
-      if (!response.ok) throw new Error("Failed to fetch files");
-      const data = await response.json();
-      
-      // Handle empty response or no files
-      if (!data || !data.files || data.files.length === 0) {
-        setAvailableFiles([]);
-        return;
-      }
-      
-      // Map files to a simpler format
-      const files = data.files.map((file: any) => ({
-        id: file.id,
-        name: file.original_filename || file.filename
-      }));
+      // The files API is paginated, so follow the cursor until every page
+      // has been read; the largest page size keeps the round trips few
+      const files: FileAttachment[] = [];
+      let cursor: string | null = null;
+      do {
+        const query: string = cursor ? `&cursor=${encodeURIComponent(cursor)}` : "";
+        const response = await fetch(`/api/files?limit=200${query}`);
+        if (!response.ok) throw new Error("Failed to fetch files");
+        const data = await response.json();
+        
+        // Only processed files have content the chat can use
+        for (const file of data?.files || []) {
+          if (file.status !== "ready") continue;
+          files.push({
+            id: file.id,
+            name: file.original_filename || file.filename
+          });
+        }
+        cursor = data?.nextCursor ?? null;
+      } while (cursor);
       
       setAvailableFiles(files);
     } catch (error) {
@@ -27,10 +27,14 @@ type FileDetails = {
   size: number;
   path: string;
   mimetype: string;
+  status: "processing" | "ready" | "failed";
   created_at: number;
   updated_at: number;
 };
 
+// How often to check back on a file that is still being processed
+const PROCESSING_POLL_INTERVAL_MS = 3000;
+
 type PdfMetadata = {
   file_id: string;
   title?: string;
@@ -89,18 +93,8 @@ export default function FileViewPage() {
         const fileData = data.file || data;
         setFile(fileData);
         
-        // Fetch PDF metadata if available
-        if (fileData && fileData.id) {
-          try {
-            const metadataResponse = await fetch(`/api/pdf-metadata?fileId=${fileData.id}`);
-            if (metadataResponse.ok) {
-              const metadataData = await metadataResponse.json();
-              setMetadata(metadataData.metadata);
-            }
-          } catch (metadataError) {
-            console.error("Error fetching PDF metadata:", metadataError);
-          }
-        }
+        // PDF metadata comes back in the same response as the file
+        setMetadata(data.metadata || null);
       } catch (error) {
         console.error("Error fetching file details:", error);
         toast.error("Failed to load file details. Please try again.");
@@ -113,6 +107,26 @@ export default function FileViewPage() {
     fetchFileDetails();
   }, [params.id, router]);
 
+  // Metadata is saved once background processing finishes; check back until then
+  useEffect(() => {
+    if (!file || file.status !== "processing") return;
+
+    const timer = setTimeout(async () => {
+      try {
+        const response = await fetch(`/api/files?id=${file.id}`);
+        if (!response.ok) return;
+
+        const data = await response.json();
+        setFile(data.file || data);
+        setMetadata(data.metadata || null);
+      } catch (error) {
+        console.error("Error refreshing file details:", error);
+      }
+    }, PROCESSING_POLL_INTERVAL_MS);
+
+    return () => clearTimeout(timer);
+  }, [file]);
+
   const onDocumentLoadSuccess = ({ numPages }: { numPages: number }) => {
     setNumPages(numPages);
   };
@@ -459,6 +473,14 @@ export default function FileViewPage() {
             </div>
           </Card>
 
+          {!metadata && file.status === "processing" && (
+            <Card className="p-4">
+              <p className="text-sm text-muted-foreground">
+                Extracting metadata from this PDF…
+              </p>
+            </Card>
+          )}
+
           {metadata && (
             <Card className="p-4">
               <div className="flex justify-between items-center mb-4">
@@ -14,30 +14,44 @@ type FileItem = {
   size: number;
   path: string;
   mimetype: string;
+  status: "processing" | "ready" | "failed";
   created_at: number;
   updated_at: number;
 };
 
+// Shown next to files whose background processing hasn't finished cleanly
+const STATUS_LABELS: Partial<Record<FileItem["status"], string>> = {
+  processing: "Processing…",
+  failed: "Processing failed",
+};
+
 export default function FilesPage() {
   const [view, setView] = useState<"grid" | "list">("grid");
   const [files, setFiles] = useState<FileItem[]>([]);
-  const [selectedFiles, setSelectedFiles] = useState<string[]>([]);
+  const [selectedFiles, setSelectedFiles] = useState<Set<string>>(new Set());
   const [loading, setLoading] = useState(true);
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
+  const [loadingMore, setLoadingMore] = useState(false);
+
+  // Fetch one page of files from the API
+  const fetchFilesPage = async (cursor?: string) => {
+    const query = cursor ? `?cursor=${encodeURIComponent(cursor)}` : "";
+    const response = await fetch(`/api/files${query}`);
+    
+    if (!response.ok) {
+      throw new Error(`Failed to fetch files: ${response.status} ${response.statusText}`);
+    }
+    
+    const data = await response.json();
+    setNextCursor(data.nextCursor ?? null);
+    return (data.files || []) as FileItem[];
+  };
 
-  // Fetch files from API
   useEffect(() => {
     const fetchFiles = async () => {
       try {
         setLoading(true);
-        const response = await fetch("/api/files");
-        
-        if (!response.ok) {
-          throw new Error(`Failed to fetch files: ${response.status} ${response.statusText}`);
-        }
-        
-        const data = await response.json();
-        console.log("Files API response:", data); // Debug log
-        setFiles(Array.isArray(data) ? data : data.files || []);
+        setFiles(await fetchFilesPage());
       } catch (error) {
         console.error("Error fetching files:", error);
         toast.error("Failed to load files. Please try again.");
@@ -50,41 +64,61 @@ export default function FilesPage() {
     fetchFiles();
   }, []);
 
+  const loadMoreFiles = async () => {
+    if (nextCursor === null) return;
+    
+    try {
+      setLoadingMore(true);
+      const moreFiles = await fetchFilesPage(nextCursor);
+      setFiles((prev) => [...prev, ...moreFiles]);
+    } catch (error) {
+      console.error("Error fetching files:", error);
+      toast.error("Failed to load more files. Please try again.");
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
   const toggleFileSelection = (id: string) => {
-    setSelectedFiles((prev) =>
-      prev.includes(id) ? prev.filter((fileId) => fileId !== id) : [...prev, id]
-    );
+    setSelectedFiles((prev) => {
+      const next = new Set(prev);
+      if (next.has(id)) {
+        next.delete(id);
+      } else {
+        next.add(id);
+      }
+      return next;
+    });
   };
 
   const selectAllFiles = () => {
-    if (selectedFiles.length === files.length) {
-      setSelectedFiles([]);
+    if (selectedFiles.size === files.length) {
+      setSelectedFiles(new Set());
     } else {
-      setSelectedFiles(files.map((file) => file.id));
+      setSelectedFiles(new Set(files.map((file) => file.id)));
     }
   };
 
   const deleteSelectedFiles = async () => {
-    if (selectedFiles.length === 0) return;
+    if (selectedFiles.size === 0) return;
     
     try {
-      // Delete each selected file
-      for (const fileId of selectedFiles) {
-        const response = await fetch(`/api/files?id=${fileId}`, {
-          method: "DELETE",
-        });
-        
-        if (!response.ok) {
-          const errorData = await response.json();
-          throw new Error(errorData.error || "Failed to delete file");
-        }
+      // Delete all selected files in one request
+      const query = Array.from(selectedFiles).map((fileId) => `id=${encodeURIComponent(fileId)}`).join("&");
+      const response = await fetch(`/api/files?${query}`, {
+        method: "DELETE",
+      });
+      
+      if (!response.ok) {
+        const errorData = await response.json();
+        throw new Error(errorData.error || "Failed to delete files");
       }
       
       // Update local state
-      setFiles((prev) => prev.filter((file) => !selectedFiles.includes(file.id)));
-      setSelectedFiles([]);
+      setFiles((prev) => prev.filter((file) => !selectedFiles.has(file.id)));
+      setSelectedFiles(new Set());
       
-      toast.success(`${selectedFiles.length} file(s) deleted successfully`);
+      toast.success(`${selectedFiles.size} file(s) deleted successfully`);
     } catch (error) {
       console.error("Error deleting files:", error);
       toast.error("Failed to delete some files. Please try again.");
@@ -157,11 +191,11 @@ export default function FilesPage() {
             size="sm"
             onClick={selectAllFiles}
           >
-            {selectedFiles.length === files.length && files.length > 0
+            {selectedFiles.size === files.length && files.length > 0
               ? "Deselect All"
               : "Select All"}
           </Button>
-          {selectedFiles.length > 0 && (
+          {selectedFiles.size > 0 && (
             <Button
               variant="destructive"
               size="sm"
@@ -197,7 +231,7 @@ export default function FilesPage() {
             <Card
               key={file.id}
               className={`overflow-hidden ${
-                selectedFiles.includes(file.id) ? "ring-2 ring-primary" : ""
+                selectedFiles.has(file.id) ? "ring-2 ring-primary" : ""
               }`}
             >
               <CardContent className="p-0">
@@ -213,7 +247,7 @@ export default function FilesPage() {
                         toggleFileSelection(file.id);
                       }}
                     >
-                      {selectedFiles.includes(file.id) ? (
+                      {selectedFiles.has(file.id) ? (
                         <svg
                           xmlns="http://www.w3.org/2000/svg"
                           viewBox="0 0 24 24"
@@ -264,6 +298,7 @@ export default function FilesPage() {
                       </div>
                       <div className="text-xs text-muted-foreground mt-1">
                         {formatBytes(file.size)} • {new Date(file.updated_at * 1000).toLocaleDateString()}
+                        {STATUS_LABELS[file.status] && ` • ${STATUS_LABELS[file.status]}`}
                       </div>
                     </div>
                   </Link>
@@ -278,7 +313,7 @@ export default function FilesPage() {
             <div
               key={file.id}
               className={`flex items-center p-3 hover:bg-accent ${
-                selectedFiles.includes(file.id) ? "bg-accent" : ""
+                selectedFiles.has(file.id) ? "bg-accent" : ""
               }`}
             >
               <div className="mr-3">
@@ -292,7 +327,7 @@ export default function FilesPage() {
                     toggleFileSelection(file.id);
                   }}
                 >
-                  {selectedFiles.includes(file.id) ? (
+                  {selectedFiles.has(file.id) ? (
                     <svg
                       xmlns="http://www.w3.org/2000/svg"
                       viewBox="0 0 24 24"
@@ -342,6 +377,9 @@ export default function FilesPage() {
                 </div>
                 <div className="flex-1 min-w-0">
                   <div className="font-medium truncate">{file.original_filename}</div>
+                  {STATUS_LABELS[file.status] && (
+                    <div className="text-xs text-muted-foreground">{STATUS_LABELS[file.status]}</div>
+                  )}
                 </div>
                 <div className="ml-4 text-sm text-muted-foreground">
                   {formatBytes(file.size)}
@@ -354,6 +392,14 @@ export default function FilesPage() {
           ))}
         </div>
       )}
+
+      {!loading && nextCursor !== null && (
+        <div className="flex justify-center">
+          <Button variant="outline" onClick={loadMoreFiles} disabled={loadingMore}>
+            {loadingMore ? "Loading..." : "Load more"}
+          </Button>
+        </div>
+      )}
     </div>
   );
 }
@@ -16,6 +16,12 @@ type UploadFile = {
   status: "pending" | "uploading" | "success" | "error";
 };
 
+// How many files are sent to the server at the same time
+const MAX_PARALLEL_UPLOADS = 3;
+
+// Identifies a local file without reading its contents
+const fileIdentity = (file: File) => `${file.name}:${file.size}:${file.lastModified}`;
+
 export default function UploadPage() {
   const router = useRouter();
   const [files, setFiles] = useState<UploadFile[]>([]);
@@ -34,7 +40,20 @@ export default function UploadPage() {
       toast.error("Some files were rejected. Only PDF files are allowed.");
     }
 
-    setFiles((prev) => [...prev, ...newFiles]);
+    // Don't queue the same file twice; the server would only discard the
+    // second copy after receiving all of its bytes
+    setFiles((prev) => {
+      const queued = new Set(prev.map((f) => fileIdentity(f.file)));
+      return [
+        ...prev,
+        ...newFiles.filter((f) => {
+          const identity = fileIdentity(f.file);
+          if (queued.has(identity)) return false;
+          queued.add(identity);
+          return true;
+        }),
+      ];
+    });
   }, []);
 
   const { getRootProps, getInputProps, isDragActive } = useDropzone({
@@ -48,6 +67,68 @@ export default function UploadPage() {
     setFiles((prev) => prev.filter((file) => file.id !== id));
   };
 
+  const uploadFile = async (fileItem: UploadFile): Promise<boolean> => {
+    try {
+      // Update progress to show starting upload
+      setFiles((prev) =>
+        prev.map((f) =>
+          f.id === fileItem.id ? { ...f, progress: 10 } : f
+        )
+      );
+
+      // Upload the raw file so the server can stream it to disk
+      const response = await fetch("/api/upload", {
+        method: "POST",
+        headers: {
+          "Content-Type": "application/pdf",
+          "X-Filename": encodeURIComponent(fileItem.file.name),
+        },
+        body: fileItem.file,
+      });
+
+      // Update progress during upload
+      setFiles((prev) =>
+        prev.map((f) =>
+          f.id === fileItem.id ? { ...f, progress: 50 } : f
+        )
+      );
+
+      if (!response.ok) {
+        const errorData = await response.json();
+        throw new Error(errorData.error || "Failed to upload file");
+      }
+
+      await response.json();
+
+      // Update file status to success
+      setFiles((prev) =>
+        prev.map((f) =>
+          f.id === fileItem.id
+            ? { ...f, progress: 100, status: "success" }
+            : f
+        )
+      );
+      return true;
+    } catch (error) {
+      console.error(`Error uploading ${fileItem.file.name}:`, error);
+      
+      // Update file status to error
+      setFiles((prev) =>
+        prev.map((f) =>
+          f.id === fileItem.id
+            ? { 
+                ...f, 
+                progress: 0, 
+                status: "error", 
+                error: error instanceof Error ? error.message : "Upload failed" 
+              }
+            : f
+        )
+      );
+      return false;
+    }
+  };
+
   const uploadFiles = async () => {
     // Update files to uploading status
     setFiles((prev) =>
@@ -57,90 +138,37 @@ export default function UploadPage() {
       }))
     );
 
-    // Upload each file
-    for (const fileItem of files) {
-      try {
-        // Update progress to show starting upload
-        setFiles((prev) =>
-          prev.map((f) =>
-            f.id === fileItem.id ? { ...f, progress: 10 } : f
-          )
-        );
-
-        const formData = new FormData();
-        formData.append("file", fileItem.file);
-
-        // Upload file
-        const response = await fetch("/api/upload", {
-          method: "POST",
-          body: formData,
-        });
-
-        // Update progress during upload
-        setFiles((prev) =>
-          prev.map((f) =>
-            f.id === fileItem.id ? { ...f, progress: 50 } : f
-          )
-        );
-
-        if (!response.ok) {
-          const errorData = await response.json();
-          throw new Error(errorData.error || "Failed to upload file");
-        }
-
-        const data = await response.json();
-
-        // Update file status to success
-        setFiles((prev) =>
-          prev.map((f) =>
-            f.id === fileItem.id
-              ? { ...f, progress: 100, status: "success" }
-              : f
-          )
-        );
-      } catch (error) {
-        console.error(`Error uploading ${fileItem.file.name}:`, error);
-        
-        // Update file status to error
-        setFiles((prev) =>
-          prev.map((f) =>
-            f.id === fileItem.id
-              ? { 
-                  ...f, 
-                  progress: 0, 
-                  status: "error", 
-                  error: error instanceof Error ? error.message : "Upload failed" 
-                }
-              : f
-          )
-        );
+    // Upload several files at once, so total time tracks the slowest upload
+    // rather than the sum of all of them, without flooding the server
+    const results: boolean[] = new Array(files.length);
+    let nextIndex = 0;
+    const runUploads = async () => {
+      while (nextIndex < files.length) {
+        const index = nextIndex++;
+        results[index] = await uploadFile(files[index]);
       }
-    }
+    };
+    await Promise.all(
+      Array.from({ length: Math.min(MAX_PARALLEL_UPLOADS, files.length) }, runUploads)
+    );
 
     // Check if all files were uploaded successfully
-    const allSuccess = files.every((file) => file.status === "success");
+    const successCount = results.filter(Boolean).length;
+    const errorCount = results.length - successCount;
     
-    if (allSuccess) {
+    if (errorCount === 0) {
       toast.success("All files uploaded successfully!");
       
       // Navigate to files page after a short delay
       setTimeout(() => {
         router.push("/dashboard/files");
       }, 1500);
+    } else if (successCount > 0) {
+      // Some succeeded, some failed
+      toast.error(`${errorCount} file(s) failed to upload. ${successCount} file(s) uploaded successfully.`);
     } else {
-      const errorCount = files.filter((file) => file.status === "error").length;
-      const successCount = files.filter((file) => file.status === "success").length;
-      
-      if (errorCount === 0) {
-        // This should never happen, but just in case
-        toast.success("All files uploaded successfully!");
-      } else if (successCount > 0) {
-        // Some succeeded, some failed
-        toast.error(`${errorCount} file(s) failed to upload. ${successCount} file(s) uploaded successfully.`);
-      } else {
-        // All failed
-        toast.error(`Failed to upload files. Please try again.`);
-      }
+      // All failed
+      toast.error(`Failed to upload files. Please try again.`);
     }
   };
 
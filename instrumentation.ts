@@ -0,0 +1,17 @@
+/**
+ * Runs once when the server starts. Loads the database and the PDF pipeline
+ * up front so the first upload doesn't pay for opening SQLite, creating the
+ * schema and compiling the MuPDF WebAssembly module.
+ */
+export async function register() {
+  if (process.env.NEXT_RUNTIME !== 'nodejs') return;
+
+  try {
+    await import('./lib/db');
+    await import('./lib/pdf/processor');
+    console.log('Server warmup complete');
+  } catch (error) {
+    // Warmup is best effort; the same modules load lazily on first use
+    console.error('Error during server warmup:', error);
+  }
+}
@@ -0,0 +1,36 @@
+import { describe, test } from 'node:test';
+import assert from 'node:assert/strict';
+import { parseGeminiResponse } from './gemini';
+
+describe('parseGeminiResponse plain-text fallback', () => {
+  test('reads labels written as markdown bullets and bold text', () => {
+    const result = parseGeminiResponse(
+      '**Title:** Deep Learning\n- **Author:** Jane Doe\nDocument Type: paper\n**Topics:** ml, ai'
+    );
+
+    assert.equal(result.title, 'Deep Learning');
+    assert.equal(result.author, 'Jane Doe');
+    assert.equal(result.documentType, 'paper');
+    assert.deepEqual(result.topics, ['ml', 'ai']);
+  });
+
+  test('takes the value of a bare label from the following lines', () => {
+    const result = parseGeminiResponse(
+      '**Summary:**\n\nFirst line of the summary.\nSecond line.\n\nTitle:\nA Title'
+    );
+
+    assert.equal(result.summary, 'First line of the summary.\nSecond line.');
+    assert.equal(result.title, 'A Title');
+  });
+
+  test('does not end a summary at a line mentioning a label word', () => {
+    const result = parseGeminiResponse(
+      'Summary: The paper reviews prior work.\nThe author argues the title undersells it.\nTopics: reviews'
+    );
+
+    assert.equal(result.summary, 'The paper reviews prior work.\nThe author argues the title undersells it.');
+    assert.equal(result.author, undefined);
+    assert.equal(result.title, undefined);
+    assert.deepEqual(result.topics, ['reviews']);
+  });
+});
@@ -1,7 +1,11 @@
-import { GoogleGenerativeAI, Part } from '@google/generative-ai';
+import { GoogleGenerativeAI, GoogleGenerativeAIFetchError, Part } from '@google/generative-ai';
 import { PdfMetadataExtraction } from '../pdf/types';
+import * as crypto from 'crypto';
 import * as fs from 'fs';
-import * as mupdfjs from 'mupdf/mupdfjs';
+import { TtlCache } from '../cache';
+import { Semaphore } from '../semaphore';
+import { debugLog } from '../debug';
+import { truncateToTokens } from './tokens';
 
 // Initialize the Gemini API
 const apiKey = process.env.GEMINI_API_KEY || '';
@@ -11,211 +15,174 @@ if (!apiKey) {
 }
 const genAI = new GoogleGenerativeAI(apiKey);
 
+// The model configuration never changes, so build it once and share it across
+// requests; its calls go through the process-wide fetch connection pool
+const GEMINI_MODEL = "gemini-2.0-flash";
+const model = genAI.getGenerativeModel({
+  model: GEMINI_MODEL,
+  generationConfig: {
+    temperature: 0.1,
+    topK: 40,
+    topP: 0.95,
+    maxOutputTokens: 1024,
+    // Ask for bare JSON so the answer can be parsed without scraping it out
+    // of markdown or prose
+    responseMimeType: "application/json",
+  }
+});
+
+// Cap on Gemini requests in flight, so a burst of uploads queues here instead
+// of tripping the API's rate limit; override with GEMINI_MAX_CONCURRENCY
+const geminiSlots = new Semaphore(Number(process.env.GEMINI_MAX_CONCURRENCY) || 4);
+
+// Rate limiting and temporary outages are worth retrying; other errors aren't
+const RETRYABLE_STATUSES = [429, 500, 503];
+const MAX_GEMINI_ATTEMPTS = 4;
+
 /**
- * Extracts text from the first N pages of a PDF file
+ * Sends a request to Gemini within the concurrency cap, retrying rate-limited
+ * and temporarily failing requests with exponential backoff and jitter
  */
-async function extractTextFromFirstPages(pdfPath: string, pageCount: number = 20): Promise<string> {
-  try {
-    // Load the document
-    const data = fs.readFileSync(pdfPath);
-    const doc = await mupdfjs.PDFDocument.openDocument(data, 'application/pdf');
-    
-    // Determine how many pages to extract
-    const totalPages = doc.countPages();
-    const pagesToExtract = Math.min(totalPages, pageCount);
-    
-    console.log(`Extracting text from ${pagesToExtract} pages out of ${totalPages} total pages`);
-    
-    // Extract text from each page
-    let extractedText = '';
-    
-    for (let i = 0; i < pagesToExtract; i++) {
-      try {
-        // Load the page
-        const page = await doc.loadPage(i);
-        
-        // Try multiple methods to extract text
-        let pageText = '';
-        
-        // Method 1: Use the walk() method which is more reliable
-        try {
-          const structuredText = page.toStructuredText("preserve-whitespace");
-          
-          // Use a StringBuilder approach to collect text
-          let textBuilder = '';
-          
-          structuredText.walk({
-            onChar: function(utf8) {
-              if (utf8) {
-                textBuilder += utf8;
-              }
-            },
-            endLine: function() {
-              textBuilder += '\n';
-            },
-            endTextBlock: function() {
-              textBuilder += '\n';
-            }
-          });
-          
-          pageText = textBuilder;
-          console.log(`Page ${i+1}: Extracted ${pageText.length} characters using walk()`);
-        } catch (walkError) {
-          console.warn(`Error using walk() for page ${i+1}:`, walkError);
-          
-          // Method 2: Fall back to JSON parsing if walk() fails
-          try {
-            const structuredText = page.toStructuredText("preserve-whitespace");
-            const textJsonString = structuredText.asJSON();
-            
-            // Parse the JSON string into an object
-            const textJson = JSON.parse(textJsonString);
-            
-            if (textJson && textJson.blocks) {
-              for (const block of textJson.blocks) {
-                if (block.type === 'text' && block.lines) {
-                  for (const line of block.lines) {
-                    if (line.text) {
-                      pageText += line.text + ' ';
-                    }
-                  }
-                  // Add a newline after each block to preserve paragraph structure
-                  pageText += '\n';
-                }
-              }
-            }
-            console.log(`Page ${i+1}: Extracted ${pageText.length} characters using JSON parsing`);
-          } catch (jsonError) {
-            console.warn(`Error parsing JSON for page ${i+1}:`, jsonError);
-          }
-        }
-        
-        // Method 3: Try using page.text() if available and other methods failed
-        if (!pageText || pageText.length === 0) {
-          try {
-            if (typeof (page as any).text === 'function') {
-              pageText = (page as any).text();
-              console.log(`Page ${i+1}: Extracted ${pageText.length} characters using text()`);
-            }
-          } catch (textError) {
-            console.warn(`Error using text() for page ${i+1}:`, textError);
-          }
-        }
-        
-        // If we still don't have text, log a warning
-        if (!pageText || pageText.length === 0) {
-          console.warn(`Warning: Could not extract text from page ${i+1}`);
-        }
-        
-        extractedText += `\n--- Page ${i+1} ---\n${pageText}\n`;
-        
-        // Clean up page resources if possible
-        if (page && typeof (page as any).close === 'function') {
-          (page as any).close();
-        }
-      } catch (pageError) {
-        console.warn(`Error extracting text from page ${i}:`, pageError);
-      }
-    }
-    
-    // Clean up document resources
+async function generateWithRetry(parts: Part[]) {
+  for (let attempt = 1; ; attempt++) {
     try {
-      if (doc && typeof (doc as any).close === 'function') {
-        (doc as any).close();
-      }
-    } catch (closeError) {
-      console.warn('Error closing document:', closeError);
+      return await geminiSlots.run(() => model.generateContent(parts));
+    } catch (error) {
+      const retryable = error instanceof GoogleGenerativeAIFetchError
+        && error.status !== undefined
+        && RETRYABLE_STATUSES.includes(error.status);
+      if (!retryable || attempt >= MAX_GEMINI_ATTEMPTS) throw error;
+
+      // The slot is released while waiting so other requests can go ahead
+      const delayMs = Math.min(2 ** attempt * 500, 10000) + Math.random() * 500;
+      console.warn(`Gemini request failed with status ${error.status}, retrying in ${Math.round(delayMs)}ms`);
+      await new Promise(resolve => setTimeout(resolve, delayMs));
     }
-    
-    return extractedText;
-  } catch (error) {
-    console.error('Error extracting text from PDF:', error);
-    throw error;
   }
 }
 
+// Recent parsed Gemini answers, keyed by the model and prompt wording, the
+// document and the fields asked for, so re-running enhancement on an unchanged
+// file doesn't call the API again
+const responseCache = new TtlCache<string, Partial<PdfMetadataExtraction>>(128, 60 * 60 * 1000);
+
+/**
+ * Metadata fields Gemini can fill in, with how to spot a missing value and
+ * how to ask for it in the prompt
+ */
+const ENHANCEABLE_FIELDS: Array<{
+  isMissing: (metadata: PdfMetadataExtraction) => boolean;
+  prompt: string;
+}> = [
+  { isMissing: metadata => !metadata.title, prompt: 'title' },
+  { isMissing: metadata => !metadata.author, prompt: 'author' },
+  { isMissing: metadata => !metadata.documentType, prompt: 'document type' },
+  { isMissing: metadata => !metadata.summary, prompt: 'summary (max 100 words)' },
+  { isMissing: metadata => metadata.topics.length === 0, prompt: 'main topics (comma-separated list)' },
+];
+
+// Response instructions shared by every metadata prompt
+const METADATA_RESPONSE_INSTRUCTIONS = `If you cannot determine any field with high confidence, respond with "UNCERTAIN" for that field.
+
+Format your response as a JSON object with these fields.`;
+
+/**
+ * Builds the metadata request for a document source (the attached PDF or
+ * the text that follows the prompt)
+ */
+function createMetadataPrompt(source: string, missingFields: string[]): string {
+  return `Based on ${source}, please provide ONLY the following information:
+${missingFields.join(', ')}
+
+${METADATA_RESPONSE_INSTRUCTIONS}`;
+}
+
+/**
+ * Formats the already extracted text of the first N pages for a prompt
+ */
+function formatFirstPages(pageTexts: string[], pageCount: number = 20): string {
+  return pageTexts
+    .slice(0, pageCount)
+    .map((pageText, i) => `\n--- Page ${i+1} ---\n${pageText}\n`)
+    .join('');
+}
+
 /**
  * Enhances PDF metadata using Gemini AI
  */
 export async function enhanceMetadataWithGemini(
   metadata: PdfMetadataExtraction, 
   fullText: string,
-  pdfPath?: string
+  pdfPath?: string,
+  pageTexts: string[] = []
 ): Promise<PdfMetadataExtraction> {
-  // Only proceed with Gemini if we need to enhance the metadata
-  const needsEnhancement = !metadata.title || !metadata.author || 
-                         metadata.summary === '' || metadata.topics.length === 0;
+  // Prepare a prompt that focuses on missing information
+  const missingFields = ENHANCEABLE_FIELDS
+    .filter(field => field.isMissing(metadata))
+    .map(field => field.prompt);
   
-  if (!needsEnhancement) {
+  // Only proceed with Gemini if we need to enhance the metadata
+  if (missingFields.length === 0) {
     return metadata;
   }
   
-  // Prepare a prompt that focuses on missing information
-  const missingFields = [];
-  if (!metadata.title) missingFields.push('title');
-  if (!metadata.author) missingFields.push('author');
-  if (!metadata.documentType) missingFields.push('document type');
-  if (metadata.summary === '') missingFields.push('summary (max 100 words)');
-  if (metadata.topics.length === 0) missingFields.push('main topics (comma-separated list)');
+  // Identify the document by file identity when we have it, otherwise by its text
+  const stats = pdfPath ? await fs.promises.stat(pdfPath).catch(() => null) : null;
+  const documentKey = pdfPath && stats
+    ? `${pdfPath}:${stats.size}:${stats.mtimeMs}`
+    : crypto.createHash('sha256').update(fullText).digest('hex');
+  const cacheKey = `${PROMPT_FINGERPRINT}|${documentKey}|${missingFields.join(',')}`;
+  
+  const cachedResponse = responseCache.get(cacheKey);
+  if (cachedResponse) {
+    debugLog("Using cached Gemini response");
+    return {
+      ...metadata,
+      ...cachedResponse,
+      aiEnhanced: true
+    };
+  }
   
   try {
-    // Get the generative model
-    const model = genAI.getGenerativeModel({
-      model: "gemini-2.0-flash",
-      generationConfig: {
-        temperature: 0.1,
-        topK: 40,
-        topP: 0.95,
-        maxOutputTokens: 1024,
-      }
-    });
-    
-    console.log("Using Gemini 2.0 Flash model for PDF analysis");
-    
     let parts: Part[] = [];
     
-    // If PDF path is provided, use it directly
-    if (pdfPath && fs.existsSync(pdfPath)) {
-      console.log(`Reading PDF file from: ${pdfPath}`);
+    // If PDF path is provided and the file exists, use it directly
+    if (pdfPath && stats) {
+      debugLog(`Reading PDF file from: ${pdfPath}`);
       try {
         // Check file size before reading the entire file
-        const stats = fs.statSync(pdfPath);
         const fileSizeInBytes = stats.size;
         const fileSizeInMB = fileSizeInBytes / (1024 * 1024);
         
         // Add text prompt
         parts.push({
-          text: `Based on this PDF document, please provide ONLY the following information:
-          ${missingFields.join(', ')}
-          
-          If you cannot determine any field with high confidence, respond with "UNCERTAIN" for that field.
-          
-          Format your response as a JSON object with these fields.`
+          text: createMetadataPrompt('this PDF document', missingFields)
         });
         
         // If file is too large, extract text from first pages instead of sending the PDF
         if (fileSizeInMB > 19) {
-          console.log(`PDF file is large (${fileSizeInMB.toFixed(2)}MB). Extracting text from first 20 pages instead of sending the full PDF.`);
-          const extractedText = await extractTextFromFirstPages(pdfPath, 20);
+          debugLog(`PDF file is large (${fileSizeInMB.toFixed(2)}MB). Using text from first 20 pages instead of sending the full PDF.`);
+          // Reuse the page text from the extraction pass rather than parsing the PDF again
+          const extractedText = formatFirstPages(pageTexts, 20);
           
           // Add the extracted text as part of the prompt
           parts[0].text += `\n\nHere is the text extracted from the first 20 pages of the document:\n${extractedText}`;
           
-          console.log(`Successfully extracted text from first 20 pages (${extractedText.length} characters)`);
+          debugLog(`Successfully extracted text from first 20 pages (${extractedText.length} characters)`);
         } else {
           // For smaller files, send the PDF directly
-          const pdfData = fs.readFileSync(pdfPath);
+          const pdfData = await fs.promises.readFile(pdfPath);
           const mimeType = 'application/pdf';
           
           // Add PDF file as a separate part
           parts.push({
             inlineData: {
-              data: Buffer.from(pdfData).toString('base64'),
+              data: pdfData.toString('base64'),
               mimeType
             }
           });
           
-          console.log("Successfully added PDF file to the request");
+          debugLog("Successfully added PDF file to the request");
         }
       } catch (error) {
         console.error("Error reading PDF file:", error);
@@ -224,22 +191,23 @@ export async function enhanceMetadataWithGemini(
       }
     } else {
       // Fallback to text-only approach
-      console.log("No PDF path provided or file doesn't exist, using text-only approach");
+      debugLog("No PDF path provided or file doesn't exist, using text-only approach");
       parts = [{ text: createTextOnlyPrompt(missingFields, fullText) }];
     }
     
     // Generate content
-    console.log("Sending request to Gemini with parts:", parts.length);
-    const result = await model.generateContent(parts);
+    debugLog(`Sending request to Gemini with parts: ${parts.length}`);
+    const result = await generateWithRetry(parts);
     const response = result.response;
     const text = response.text();
     
     // Log the raw response for debugging
-    console.log("Raw Gemini response:", text);
+    debugLog("Raw Gemini response:", () => text);
     
     // Parse the response into a structured format
     const parsedResponse = parseGeminiResponse(text);
-    console.log("Parsed Gemini response:", parsedResponse);
+    debugLog("Parsed Gemini response:", () => parsedResponse);
+    responseCache.set(cacheKey, parsedResponse);
     
     // Merge the parsed response with the existing metadata
     return {
@@ -256,21 +224,62 @@ export async function enhanceMetadataWithGemini(
   }
 }
 
+// How much of the document text a text-only prompt includes
+const TEXT_PROMPT_MAX_DOCUMENT_TOKENS = 4000;
+
 /**
  * Creates a text-only prompt for Gemini
  */
 function createTextOnlyPrompt(missingFields: string[], fullText: string): string {
-  return `
-    Based on the following document text, please provide ONLY the following information:
-    ${missingFields.join(', ')}
-    
-    If you cannot determine any field with high confidence, respond with "UNCERTAIN" for that field.
-    
-    Format your response as a JSON object with these fields.
-    
-    Document text:
-    ${fullText.substring(0, 15000)}  // Limit text length to avoid token limits
-  `;
+  return `${createMetadataPrompt('the following document text', missingFields)}
+
+Document text:
+${truncateToTokens(fullText, TEXT_PROMPT_MAX_DOCUMENT_TOKENS)}`;
+}
+
+// Identifies the model and prompt templates an answer came from, so cached
+// answers are not served after either one changes
+const PROMPT_FINGERPRINT = crypto
+  .createHash('sha256')
+  .update(GEMINI_MODEL)
+  .update(createMetadataPrompt('{source}', ['{fields}']))
+  .update(String(TEXT_PROMPT_MAX_DOCUMENT_TOKENS))
+  .digest('hex')
+  .slice(0, 16);
+
+// Field names Gemini sometimes uses in its JSON, and the fields they map to
+const GEMINI_FIELD_ALIASES: Record<string, keyof PdfMetadataExtraction> = {
+  main_topics: 'topics',
+  document_type: 'documentType',
+};
+
+// Labels recognised in a plain-text (non-JSON) response, and the metadata
+// fields they fill
+type PlainTextField = 'title' | 'author' | 'documentType' | 'summary' | 'topics';
+const PLAIN_TEXT_FIELDS: Record<string, PlainTextField> = {
+  'title': 'title',
+  'author': 'author',
+  'document type': 'documentType',
+  'summary': 'summary',
+  'topics': 'topics',
+};
+// A label at the start of a (trimmed) line, optionally as a markdown bullet,
+// heading or bold text: "Title: ...", "- **Summary:** ...", "## Topics". A
+// label without a colon must stand alone, so prose such as "Author notes
+// that..." inside a summary is not mistaken for one
+const PLAIN_TEXT_LABEL = /^(?:[-*]\s+|#+\s*)?(?:\*\*|__)?(document type|title|author|summary|topics)(?:\*\*|__)?(?:\s*:(?:\*\*|__)?\s*(.*)|\s*)$/i;
+
+/**
+ * Returns the JSON object text in a Gemini response: the response itself when
+ * it is a bare object, otherwise one found inside a ```json fence or prose
+ */
+function extractJsonText(text: string): string | undefined {
+  const trimmed = text.trim();
+  if (trimmed.startsWith('{') && trimmed.endsWith('}')) return trimmed;
+
+  const jsonMatch = text.match(/```json\s*([\s\S]*?)\s*```/) || 
+                   text.match(/{[\s\S]*}/);
+  return jsonMatch ? jsonMatch[0].replace(/```json|```/g, '').trim() : undefined;
 }
 
 /**
@@ -278,25 +287,20 @@ function createTextOnlyPrompt(missingFields: string[], fullText: string): string
  */
 export function parseGeminiResponse(text: string): Partial<PdfMetadataExtraction> {
   try {
-    // Try to extract JSON from the response
-    const jsonMatch = text.match(/```json\s*([\s\S]*?)\s*```/) || 
-                     text.match(/{[\s\S]*}/);
+    // Responses are requested as JSON, so try the whole text first; fall back
+    // to pulling a JSON block out of markdown or prose
+    const jsonString = extractJsonText(text);
     
-    if (jsonMatch) {
-      const jsonString = jsonMatch[0].replace(/```json|```/g, '').trim();
-      console.log("Extracted JSON string:", jsonString);
+    if (jsonString) {
+      debugLog("Extracted JSON string:", () => jsonString);
       const parsed = JSON.parse(jsonString);
       
       // Map field names from Gemini response to our expected field names
-      if (parsed.main_topics && !parsed.topics) {
-        parsed.topics = parsed.main_topics;
-        delete parsed.main_topics;
-      }
-      
-      // Convert document_type to documentType if needed
-      if (parsed.document_type && !parsed.documentType) {
-        parsed.documentType = parsed.document_type;
-        delete parsed.document_type;
+      for (const [alias, field] of Object.entries(GEMINI_FIELD_ALIASES)) {
+        if (parsed[alias] && !parsed[field]) {
+          parsed[field] = parsed[alias];
+          delete parsed[alias];
+        }
       }
       
       // Convert topics to array if it's a string
@@ -310,29 +314,45 @@ export function parseGeminiResponse(text: string): Partial<PdfMetadataExtraction
       return parsed;
     }
     
-    // If no JSON found, try to extract information from plain text
-    const result: Partial<PdfMetadataExtraction> = {};
-    
-    // Extract title
-    const titleMatch = text.match(/title:?\s*([^\n]+)/i);
-    if (titleMatch) result.title = titleMatch[1].trim();
+    // If no JSON found, pick the labelled fields out of the plain text in a
+    // single walk over its lines. The first occurrence of each label wins; a
+    // bare label takes its value from the next non-blank line, and the summary
+    // also takes the unlabelled lines that follow it up to a blank line.
+    const values: Partial<Record<PlainTextField, string>> = {};
+    let openField: PlainTextField | null = null;
     
-    // Extract author
-    const authorMatch = text.match(/author:?\s*([^\n]+)/i);
-    if (authorMatch) result.author = authorMatch[1].trim();
-    
-    // Extract document type
-    const docTypeMatch = text.match(/document type:?\s*([^\n]+)/i);
-    if (docTypeMatch) result.documentType = docTypeMatch[1].trim();
-    
-    // Extract summary
-    const summaryMatch = text.match(/summary:?\s*([^\n]+(\n[^\n]+)*)/i);
-    if (summaryMatch) result.summary = summaryMatch[1].trim();
+    for (const line of text.split('\n').map(l => l.trim())) {
+      const labelMatch = line.match(PLAIN_TEXT_LABEL);
+      if (labelMatch) {
+        const field = PLAIN_TEXT_FIELDS[labelMatch[1].toLowerCase()];
+        const value = (labelMatch[2] || '').trim();
+        if (values[field] !== undefined) {
+          openField = null;
+          continue;
+        }
+        if (value) values[field] = value;
+        openField = !value || field === 'summary' ? field : null;
+      } else if (!line) {
+        // A blank line ends a value, but not the gap between a bare label
+        // and its value
+        if (openField && values[openField] !== undefined) openField = null;
+      } else if (openField) {
+        if (values[openField] === undefined) {
+          values[openField] = line;
+          if (openField !== 'summary') openField = null;
+        } else {
+          values[openField] += '\n' + line;
+        }
+      }
+    }
     
-    // Extract topics
-    const topicsMatch = text.match(/topics:?\s*([^\n]+)/i);
-    if (topicsMatch) {
-      result.topics = topicsMatch[1]
+    const result: Partial<PdfMetadataExtraction> = {};
+    if (values.title !== undefined) result.title = values.title;
+    if (values.author !== undefined) result.author = values.author;
+    if (values.documentType !== undefined) result.documentType = values.documentType;
+    if (values.summary !== undefined) result.summary = values.summary;
+    if (values.topics !== undefined) {
+      result.topics = values.topics
         .split(',')
         .map(t => t.trim())
         .filter(t => t);
@@ -0,0 +1,18 @@
+// Rough characters-per-token ratio for English text with OpenAI and Gemini
+// tokenizers; close enough for budgeting without shipping a tokenizer
+const CHARS_PER_TOKEN = 4;
+
+/**
+ * Estimates how many tokens a piece of text will use
+ */
+export function estimateTokens(text: string): number {
+  return Math.ceil(text.length / CHARS_PER_TOKEN);
+}
+
+/**
+ * Cuts text down to roughly the given number of tokens
+ */
+export function truncateToTokens(text: string, maxTokens: number): string {
+  const maxChars = maxTokens * CHARS_PER_TOKEN;
+  return text.length > maxChars ? text.slice(0, maxChars) : text;
+}
@@ -0,0 +1,41 @@
+/**
+ * A small in-memory cache whose entries expire after a fixed time-to-live.
+ * When the cache is full the oldest entry is evicted to make room.
+ */
+export class TtlCache<K, V> {
+  private entries = new Map<K, { value: V; expiresAt: number }>();
+
+  constructor(private maxSize: number, private ttlMs: number) {}
+
+  get(key: K): V | undefined {
+    const entry = this.entries.get(key);
+    if (!entry) return undefined;
+
+    if (entry.expiresAt <= Date.now()) {
+      this.entries.delete(key);
+      return undefined;
+    }
+
+    return entry.value;
+  }
+
+  set(key: K, value: V) {
+    // Re-inserting moves the key to the back of the Map's insertion order
+    this.entries.delete(key);
+
+    if (this.entries.size >= this.maxSize) {
+      const oldestKey = this.entries.keys().next().value;
+      if (oldestKey !== undefined) this.entries.delete(oldestKey);
+    }
+
+    this.entries.set(key, { value, expiresAt: Date.now() + this.ttlMs });
+  }
+
+  delete(key: K) {
+    this.entries.delete(key);
+  }
+
+  clear() {
+    this.entries.clear();
+  }
+}
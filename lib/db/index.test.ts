@@ -0,0 +1,120 @@
+import { after, before, describe, test } from 'node:test';
+import assert from 'node:assert/strict';
+import fs from 'fs';
+import os from 'os';
+import path from 'path';
+
+// The database lives under <cwd>/data, so run against a throwaway directory
+const tempDir = fs.mkdtempSync(path.join(os.tmpdir(), 'pdverse-db-test-'));
+let db: typeof import('./index');
+
+before(async () => {
+  process.chdir(tempDir);
+  db = await import('./index');
+});
+
+after(() => {
+  fs.rmSync(tempDir, { recursive: true, force: true });
+});
+
+function createTestFile(contentHash?: string) {
+  return db.createFile({
+    filename: 'test.pdf',
+    originalFilename: 'Test.pdf',
+    size: 1024,
+    path: '/api/uploads/test.pdf',
+    mimetype: 'application/pdf',
+    contentHash,
+  });
+}
+
+describe('getFileWithMetadata', () => {
+  test('returns the file with no metadata when none is saved', () => {
+    const file = createTestFile();
+
+    const result = db.getFileWithMetadata(file.id);
+
+    assert.ok(result);
+    assert.equal(result.file.id, file.id);
+    assert.equal(result.file.original_filename, 'Test.pdf');
+    assert.equal(result.metadata, null);
+  });
+
+  test('returns the file together with its metadata', () => {
+    const file = createTestFile();
+    db.savePdfMetadata({ fileId: file.id, title: 'A Title', pageCount: 3 });
+
+    const result = db.getFileWithMetadata(file.id);
+
+    assert.ok(result);
+    assert.equal(result.file.id, file.id);
+    assert.equal(result.file.size, 1024);
+    assert.ok(result.metadata);
+    assert.equal(result.metadata.file_id, file.id);
+    assert.equal(result.metadata.title, 'A Title');
+    assert.equal(result.metadata.page_count, 3);
+  });
+
+  test('returns undefined for an unknown file', () => {
+    assert.equal(db.getFileWithMetadata('00000000-0000-0000-0000-000000000000'), undefined);
+  });
+
+  test('reflects writes made after a cached read', () => {
+    const file = createTestFile();
+    assert.equal(db.getFileWithMetadata(file.id)?.metadata, null);
+
+    db.savePdfMetadata({ fileId: file.id, title: 'Saved Later' });
+    db.updateFile(file.id, { status: 'failed' });
+
+    const result = db.getFileWithMetadata(file.id);
+    assert.ok(result);
+    assert.equal(result.file.status, 'failed');
+    assert.equal(result.metadata?.title, 'Saved Later');
+  });
+});
+
+describe('getFileByContentHash', () => {
+  test('returns the stored file with its metadata and chunk count', () => {
+    const file = createTestFile('hash-with-metadata');
+    db.savePdfMetadata({ fileId: file.id, title: 'Hashed' });
+    db.saveDocumentChunks([
+      { documentId: file.id, pageNumber: 1, chunkIndex: 0, content: 'first' },
+      { documentId: file.id, pageNumber: 1, chunkIndex: 1, content: 'second' },
+    ]);
+
+    const existing = db.getFileByContentHash('hash-with-metadata');
+
+    assert.ok(existing);
+    assert.equal(existing.file.id, file.id);
+    assert.ok(existing.metadata);
+    assert.equal(existing.metadata.title, 'Hashed');
+    assert.equal(existing.chunkCount, 2);
+  });
+
+  test('returns a file without metadata or chunks', () => {
+    const file = createTestFile('hash-without-metadata');
+
+    const existing = db.getFileByContentHash('hash-without-metadata');
+
+    assert.ok(existing);
+    assert.equal(existing.file.id, file.id);
+    assert.equal(existing.metadata, null);
+    assert.equal(existing.chunkCount, 0);
+  });
+
+  test('skips uploads that failed or are still processing', () => {
+    const failed = createTestFile('hash-retried');
+    db.updateFile(failed.id, { status: 'failed' });
+    assert.equal(db.getFileByContentHash('hash-retried'), undefined);
+
+    db.updateFile(failed.id, { status: 'processing' });
+    assert.equal(db.getFileByContentHash('hash-retried'), undefined);
+
+    const retried = createTestFile('hash-retried');
+    assert.equal(db.getFileByContentHash('hash-retried')?.file.id, retried.id);
+  });
+
+  test('returns undefined for an unknown hash', () => {
+    assert.equal(db.getFileByContentHash('unknown-hash'), undefined);
+  });
+});
@@ -2,6 +2,7 @@ import Database from 'better-sqlite3';
 import path from 'path';
 import fs from 'fs';
 import { v4 as uuidv4 } from 'uuid';
+import { TtlCache } from '../cache';
 
 // Ensure data directory exists
 const DATA_DIR = path.join(process.cwd(), 'data');
@@ -12,14 +13,59 @@ if (!fs.existsSync(DATA_DIR)) {
 // Database file path
 const DB_PATH = path.join(DATA_DIR, 'pdverse.db');
 
-// Create SQLite database connection
-const db = new Database(DB_PATH);
+// Share one SQLite connection per process. Next.js re-evaluates this module
+// on every hot reload in development (and may load it once per route bundle),
+// so keep the connection on globalThis rather than opening a new one each time.
+const globalForDb = globalThis as unknown as { pdverseDb?: Database.Database };
+
+const isNewConnection = !globalForDb.pdverseDb;
+const db = globalForDb.pdverseDb ?? new Database(DB_PATH);
+globalForDb.pdverseDb = db;
+
+/**
+ * Adds columns that tables created by older versions of the schema lack
+ */
+function addMissingColumns(table: string, columns: Record<string, string>) {
+  const existing = (db.prepare(`PRAGMA table_info(${table})`).all() as any[]).map(col => col.name);
+
+  for (const [name, definition] of Object.entries(columns)) {
+    if (!existing.includes(name)) {
+      db.prepare(`ALTER TABLE ${table} ADD COLUMN ${name} ${definition}`).run();
+      console.log(`Added ${name} column to ${table} table`);
+    }
+  }
+}
 
 // Initialize database with tables
 function initializeDatabase() {
   // Enable foreign keys
   db.pragma('foreign_keys = ON');
 
+  // better-sqlite3 calls are synchronous, so keep each one short: WAL lets
+  // reads proceed while a write is in progress, NORMAL sync is safe under WAL
+  // and avoids an fsync per commit, and a busy timeout waits out a competing
+  // writer instead of failing immediately
+  db.pragma('journal_mode = WAL');
+  db.pragma('synchronous = NORMAL');
+  db.pragma('busy_timeout = 5000');
+
+  // Queries run on the event loop, so make each one as cheap as possible:
+  // a 64 MB page cache and memory-mapped reads keep hot pages out of read()
+  // syscalls, and temp tables for sorts stay in memory
+  db.pragma('cache_size = -65536');
+  db.pragma('mmap_size = 268435456');
+  db.pragma('temp_store = MEMORY');
+
+  // Run all of the schema setup as a single transaction, so startup commits
+  // (and syncs the WAL) once rather than once per statement
+  db.transaction(createSchema)();
+
+  console.log(`Database initialized at: ${DB_PATH}`);
+  console.log('Database initialized successfully');
+}
+
+// Create tables and indexes, upgrading databases from older schema versions
+function createSchema() {
   // Create users table
   db.exec(`
     CREATE TABLE IF NOT EXISTS users (
@@ -41,12 +87,40 @@ function initializeDatabase() {
       path TEXT NOT NULL,
       mimetype TEXT NOT NULL,
       user_id TEXT,
+      content_hash TEXT,
+      status TEXT NOT NULL DEFAULT 'ready',
       created_at INTEGER NOT NULL DEFAULT (unixepoch()),
       updated_at INTEGER NOT NULL DEFAULT (unixepoch()),
       FOREIGN KEY (user_id) REFERENCES users(id)
     )
   `);
 
+  addMissingColumns('files', {
+    content_hash: 'TEXT',
+    status: "TEXT NOT NULL DEFAULT 'ready'",
+  });
+
+  // Let paginated listings seek to each page and read files newest first
+  // straight off an index instead of sorting the whole table
+  db.exec(`
+    DROP INDEX IF EXISTS idx_files_created_at;
+    CREATE INDEX IF NOT EXISTS idx_files_created_at_id
+    ON files(created_at, id)
+  `);
+
+  // Look up uploads by content so duplicates can be detected before parsing
+  db.exec(`
+    CREATE INDEX IF NOT EXISTS idx_files_content_hash
+    ON files(content_hash)
+  `);
+
+  // Per-user listings filter on user_id and page by (created_at, id)
+  db.exec(`
+    DROP INDEX IF EXISTS idx_files_user_id_created_at;
+    CREATE INDEX IF NOT EXISTS idx_files_user_id_created_at_id
+    ON files(user_id, created_at, id)
+  `);
+
   // Create tags table
   db.exec(`
     CREATE TABLE IF NOT EXISTS tags (
@@ -70,6 +144,13 @@ function initializeDatabase() {
     )
   `);
 
+  // The primary key covers lookups by file; cascades from deleted tags need
+  // their own index
+  db.exec(`
+    CREATE INDEX IF NOT EXISTS idx_file_tags_tag_id
+    ON file_tags(tag_id)
+  `);
+
   // Create chat_sessions table
   db.exec(`
     CREATE TABLE IF NOT EXISTS chat_sessions (
@@ -94,6 +175,12 @@ function initializeDatabase() {
     )
   `);
 
+  // Read a session's messages in order without sorting
+  db.exec(`
+    CREATE INDEX IF NOT EXISTS idx_chat_messages_session_id_created_at
+    ON chat_messages(session_id, created_at)
+  `);
+
   // Create chat_session_files junction table
   db.exec(`
     CREATE TABLE IF NOT EXISTS chat_session_files (
@@ -106,6 +193,13 @@ function initializeDatabase() {
     )
   `);
 
+  // The primary key leads with session_id, so deleting a file would scan the
+  // whole table to cascade without an index on file_id
+  db.exec(`
+    CREATE INDEX IF NOT EXISTS idx_chat_session_files_file_id
+    ON chat_session_files(file_id)
+  `);
+
   // Create pdf_metadata table
   db.exec(`
     CREATE TABLE IF NOT EXISTS pdf_metadata (
@@ -130,6 +224,16 @@ function initializeDatabase() {
     )
   `);
 
+  // Upgrade pdf_metadata tables created before AI enhancement existed. This
+  // used to run on every upload; once at startup is enough.
+  addMissingColumns('pdf_metadata', {
+    summary: 'TEXT',
+    document_type: 'TEXT',
+    topics: 'TEXT',
+    ai_enhanced: 'INTEGER DEFAULT 0',
+    needs_review: 'INTEGER DEFAULT 0',
+  });
+
   // Create settings table
   db.exec(`
     CREATE TABLE IF NOT EXISTS settings (
@@ -143,6 +247,12 @@ function initializeDatabase() {
     )
   `);
 
+  // Settings are looked up by key for a user
+  db.exec(`
+    CREATE INDEX IF NOT EXISTS idx_settings_user_id_key
+    ON settings(user_id, key)
+  `);
+
   // Create document_chunks table
   db.exec(`
     CREATE TABLE IF NOT EXISTS document_chunks (
@@ -159,18 +269,87 @@ function initializeDatabase() {
     )
   `);
 
-  console.log(`Database initialized at: ${DB_PATH}`);
-  console.log('Database initialized successfully');
+  // Index chunks by document so per-document lookups, counts and the
+  // ON DELETE CASCADE from files don't scan the whole chunks table
+  db.exec(`
+    CREATE INDEX IF NOT EXISTS idx_document_chunks_document_id
+    ON document_chunks(document_id, chunk_index)
+  `);
+}
+
+/**
+ * Marks uploads that were still processing when the server last stopped as
+ * failed. Their background job died with the old process, so without this
+ * they would show as processing forever and could never be uploaded again.
+ */
+function failInterruptedProcessing() {
+  const { changes } = db.prepare(
+    "UPDATE files SET status = 'failed', updated_at = unixepoch() WHERE status = 'processing'"
+  ).run();
+  if (changes > 0) {
+    console.log(`Marked ${changes} interrupted upload(s) as failed`);
+  }
 }
 
 // Initialize the database
 initializeDatabase();
 
+// Only on the first load in this process: later loads (hot reloads, other
+// route bundles) share the connection while this process's jobs are running
+if (isNewConnection) {
+  failInterruptedProcessing();
+}
+
+// Short-lived caches for the read-heavy file endpoints. Any write to files or
+// pdf_metadata clears them, so the TTL only bounds memory and staleness from
+// writes made outside this module.
+const fileDetailCache = new TtlCache<string, { file: FileRecord; metadata: PdfMetadata | null }>(1024, 60 * 1000);
+const fileListCache = new TtlCache<string, FilePage>(64, 15 * 1000);
+
+function invalidateFileCaches(fileId: string) {
+  fileDetailCache.delete(fileId);
+  fileListCache.clear();
+}
+
 // Helper functions for common database operations
 
+// Prepared statements by SQL text. Compiling a statement is much more
+// expensive than running it, and the helpers below run the same handful of
+// queries over and over.
+const statementCache = new Map<string, Database.Statement>();
+
+function prepare(sql: string): Database.Statement {
+  let stmt = statementCache.get(sql);
+  if (!stmt) {
+    stmt = db.prepare(sql);
+    statementCache.set(sql, stmt);
+  }
+  return stmt;
+}
+
+/**
+ * Picks the defined fields of data that have a known column, in the order of
+ * the column map. Keys outside the map are ignored, so they can never reach
+ * the generated SQL.
+ */
+function pickColumns(data: Record<string, unknown>, columnMap: Record<string, string>) {
+  const columns: string[] = [];
+  const values: unknown[] = [];
+
+  for (const key in columnMap) {
+    const value = data[key];
+    if (value !== undefined) {
+      columns.push(columnMap[key]);
+      values.push(value);
+    }
+  }
+
+  return { columns, values };
+}
+
 // User functions
 export function createUser(data: { name?: string; email: string }) {
-  const stmt = db.prepare(`
+  const stmt = prepare(`
     INSERT INTO users (id, name, email, created_at, updated_at)
     VALUES (?, ?, ?, unixepoch(), unixepoch())
   `);
@@ -182,16 +361,19 @@ export function createUser(data: { name?: string; email: string }) {
 }
 
 export function getUserById(id: string) {
-  const stmt = db.prepare('SELECT * FROM users WHERE id = ?');
+  const stmt = prepare('SELECT * FROM users WHERE id = ?');
   return stmt.get(id);
 }
 
 export function getUserByEmail(email: string) {
-  const stmt = db.prepare('SELECT * FROM users WHERE email = ?');
+  const stmt = prepare('SELECT * FROM users WHERE email = ?');
   return stmt.get(email);
 }
 
 // File type
+// 'processing' while a new upload is being parsed and enhanced in the background
+export type FileStatus = 'processing' | 'ready' | 'failed';
+
 export type FileRecord = {
   id: string;
   filename: string;
@@ -200,6 +382,8 @@ export type FileRecord = {
   path: string;
   mimetype: string;
   user_id?: string;
+  content_hash?: string | null;
+  status: FileStatus;
   created_at: number;
   updated_at: number;
 };
@@ -212,10 +396,12 @@ export function createFile(data: {
   path: string;
   mimetype: string;
   userId?: string;
+  contentHash?: string;
+  status?: FileStatus;
 }): FileRecord {
-  const stmt = db.prepare(`
-    INSERT INTO files (id, filename, original_filename, size, path, mimetype, user_id, created_at, updated_at)
-    VALUES (?, ?, ?, ?, ?, ?, ?, unixepoch(), unixepoch())
+  const stmt = prepare(`
+    INSERT INTO files (id, filename, original_filename, size, path, mimetype, user_id, content_hash, status, created_at, updated_at)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, unixepoch(), unixepoch())
   `);
   
   const id = uuidv4();
@@ -226,28 +412,146 @@ export function createFile(data: {
     data.size,
     data.path,
     data.mimetype,
-    data.userId || null
+    data.userId || null,
+    data.contentHash || null,
+    data.status || 'ready'
   );
   
+  invalidateFileCaches(id);
   return getFileById(id) as FileRecord;
 }
 
 export function getFileById(id: string): FileRecord | undefined {
-  const stmt = db.prepare('SELECT * FROM files WHERE id = ?');
+  const stmt = prepare('SELECT * FROM files WHERE id = ?');
   return stmt.get(id) as FileRecord | undefined;
 }
 
-export function getAllFiles(userId?: string): FileRecord[] {
-  let stmt;
-  if (userId) {
-    stmt = db.prepare('SELECT * FROM files WHERE user_id = ? ORDER BY created_at DESC');
-    return stmt.all(userId) as FileRecord[];
-  } else {
-    stmt = db.prepare('SELECT * FROM files ORDER BY created_at DESC');
-    return stmt.all() as FileRecord[];
+/**
+ * Finds an already uploaded and successfully processed file with the same
+ * SHA-256 content hash, along with its metadata and chunk count, in a single
+ * query. Uploads that are still processing or that failed are skipped, so
+ * the same PDF can be uploaded again to retry them.
+ */
+export function getFileByContentHash(contentHash: string): {
+  file: FileRecord;
+  metadata: PdfMetadata | null;
+  chunkCount: number;
+} | undefined {
+  // expand() nests columns under the name of their source table (not the
+  // alias), and puts expression columns like chunk_count under '$'
+  const stmt = prepare(`
+    SELECT f.*, m.*,
+      (SELECT COUNT(*) FROM document_chunks c WHERE c.document_id = f.id) AS chunk_count
+    FROM files f
+    LEFT JOIN pdf_metadata m ON m.file_id = f.id
+    WHERE f.content_hash = ? AND f.status = 'ready'
+    LIMIT 1
+  `).expand(true);
+
+  const row = stmt.get(contentHash) as
+    { files: FileRecord; pdf_metadata: PdfMetadata; $: { chunk_count: number } } | undefined;
+  if (!row) return undefined;
+
+  return {
+    file: row.files,
+    metadata: row.pdf_metadata.file_id ? row.pdf_metadata : null,
+    chunkCount: row.$.chunk_count
+  };
+}
+
+// Page sizes for file listings
+export const DEFAULT_FILE_PAGE_SIZE = 50;
+export const MAX_FILE_PAGE_SIZE = 200;
+
+// Columns returned by file listings; internal ones like content_hash stay out
+export type FileListItem = Pick<FileRecord,
+  'id' | 'filename' | 'original_filename' | 'size' | 'path' | 'mimetype' | 'status' | 'created_at' | 'updated_at'>;
+
+const FILE_LIST_COLUMNS = 'id, filename, original_filename, size, path, mimetype, status, created_at, updated_at';
+
+export type FilePage = {
+  files: FileListItem[];
+  nextCursor: string | null;
+};
+
+// A page cursor is the created_at and id of the last file on the previous
+// page; id breaks ties between files uploaded in the same second
+function encodeFileCursor(file: FileListItem): string {
+  return `${file.created_at}:${file.id}`;
+}
+
+function decodeFileCursor(cursor: string): { createdAt: number; id: string } | undefined {
+  const separator = cursor.indexOf(':');
+  const createdAt = Number(cursor.slice(0, separator));
+  const id = cursor.slice(separator + 1);
+  if (separator === -1 || !Number.isInteger(createdAt) || !id) return undefined;
+  return { createdAt, id };
+}
+
+/**
+ * Lists files newest first, one page at a time. Pages are keyed by cursor
+ * rather than offset, so each page is a seek on the (created_at, id) index
+ * no matter how deep into the listing it is. nextCursor is null once the last
+ * page has been returned; an unreadable cursor starts from the first page.
+ */
+export function listFiles(options: {
+  userId?: string;
+  limit?: number;
+  cursor?: string;
+} = {}): FilePage {
+  const limit = Math.min(Math.max(options.limit || DEFAULT_FILE_PAGE_SIZE, 1), MAX_FILE_PAGE_SIZE);
+  const after = options.cursor ? decodeFileCursor(options.cursor) : undefined;
+
+  const cacheKey = `${options.userId || ''}:${limit}:${after ? options.cursor : ''}`;
+  const cached = fileListCache.get(cacheKey);
+  if (cached) return cached;
+
+  const conditions: string[] = [];
+  const params: unknown[] = [];
+  if (options.userId) {
+    conditions.push('user_id = ?');
+    params.push(options.userId);
+  }
+  if (after) {
+    conditions.push('(created_at, id) < (?, ?)');
+    params.push(after.createdAt, after.id);
   }
+  const where = conditions.length > 0 ? `WHERE ${conditions.join(' AND ')}` : '';
+
+  // Fetch one extra row to know whether another page follows
+  const stmt = prepare(`SELECT ${FILE_LIST_COLUMNS} FROM files ${where} ORDER BY created_at DESC, id DESC LIMIT ?`);
+  const rows = stmt.all(...params, limit + 1) as FileListItem[];
+
+  const files = rows.slice(0, limit);
+  const page: FilePage = {
+    files,
+    nextCursor: rows.length > limit ? encodeFileCursor(files[files.length - 1]) : null,
+  };
+
+  fileListCache.set(cacheKey, page);
+  return page;
+}
+
+/**
+ * Total bytes and number of stored uploads, summed from the files table
+ * rather than by walking the uploads directory
+ */
+export function getStorageUsage(): { used: number; fileCount: number } {
+  const stmt = prepare('SELECT COALESCE(SUM(size), 0) AS used, COUNT(*) AS fileCount FROM files');
+  return stmt.get() as { used: number; fileCount: number };
 }
 
+// Updatable files columns, keyed by their camelCase field names
+const FILE_COLUMNS: Record<string, string> = {
+  filename: 'filename',
+  originalFilename: 'original_filename',
+  size: 'size',
+  path: 'path',
+  mimetype: 'mimetype',
+  userId: 'user_id',
+  status: 'status',
+};
+
 export function updateFile(id: string, data: Partial<{
   filename: string;
   originalFilename: string;
@@ -255,37 +559,53 @@ export function updateFile(id: string, data: Partial<{
   path: string;
   mimetype: string;
   userId: string;
+  status: FileStatus;
 }>) {
-  const updates = Object.entries(data)
-    .filter(([_, value]) => value !== undefined)
-    .map(([key, _]) => {
-      // Convert camelCase to snake_case
-      return `${key.replace(/([A-Z])/g, '_$1').toLowerCase()} = ?`;
-    });
+  const { columns, values } = pickColumns(data, FILE_COLUMNS);
   
-  if (updates.length === 0) return getFileById(id);
+  if (columns.length === 0) return getFileById(id);
   
   const sql = `
     UPDATE files
-    SET ${updates.join(', ')}, updated_at = unixepoch()
+    SET ${columns.map(column => `${column} = ?`).join(', ')}, updated_at = unixepoch()
     WHERE id = ?
   `;
   
-  const stmt = db.prepare(sql);
-  const values = [...Object.values(data).filter(v => v !== undefined), id];
-  stmt.run(...values);
+  const stmt = prepare(sql);
+  stmt.run(...values, id);
   
+  invalidateFileCaches(id);
   return getFileById(id);
 }
 
-export function deleteFile(id: string) {
-  const stmt = db.prepare('DELETE FROM files WHERE id = ?');
-  return stmt.run(id);
+/**
+ * Deletes a file and returns the deleted row, or undefined if it didn't exist.
+ * Chunks, metadata, tags and chat links are removed by ON DELETE CASCADE as
+ * part of the same statement.
+ */
+export function deleteFile(id: string): FileRecord | undefined {
+  return deleteFiles([id])[0];
+}
+
+/**
+ * Deletes several files in one statement and returns the rows that existed
+ */
+export function deleteFiles(ids: string[]): FileRecord[] {
+  if (ids.length === 0) return [];
+
+  const placeholders = ids.map(() => '?').join(', ');
+  const stmt = db.prepare(`DELETE FROM files WHERE id IN (${placeholders}) RETURNING *`);
+  const deleted = stmt.all(...ids) as FileRecord[];
+
+  for (const id of ids) {
+    invalidateFileCaches(id);
+  }
+  return deleted;
 }
 
 // Tag functions
 export function createTag(data: { name: string; userId?: string }) {
-  const stmt = db.prepare(`
+  const stmt = prepare(`
     INSERT INTO tags (id, name, user_id, created_at)
     VALUES (?, ?, ?, unixepoch())
   `);
@@ -297,24 +617,24 @@ export function createTag(data: { name: string; userId?: string }) {
 }
 
 export function getTagById(id: string) {
-  const stmt = db.prepare('SELECT * FROM tags WHERE id = ?');
+  const stmt = prepare('SELECT * FROM tags WHERE id = ?');
   return stmt.get(id);
 }
 
 export function getAllTags(userId?: string) {
   let stmt;
   if (userId) {
-    stmt = db.prepare('SELECT * FROM tags WHERE user_id = ? OR user_id IS NULL ORDER BY name');
+    stmt = prepare('SELECT * FROM tags WHERE user_id = ? OR user_id IS NULL ORDER BY name');
     return stmt.all(userId);
   } else {
-    stmt = db.prepare('SELECT * FROM tags ORDER BY name');
+    stmt = prepare('SELECT * FROM tags ORDER BY name');
     return stmt.all();
   }
 }
 
 // File tag functions
 export function addTagToFile(fileId: string, tagId: string) {
-  const stmt = db.prepare(`
+  const stmt = prepare(`
     INSERT OR IGNORE INTO file_tags (file_id, tag_id, created_at)
     VALUES (?, ?, unixepoch())
   `);
@@ -323,12 +643,12 @@ export function addTagToFile(fileId: string, tagId: string) {
 }
 
 export function removeTagFromFile(fileId: string, tagId: string) {
-  const stmt = db.prepare('DELETE FROM file_tags WHERE file_id = ? AND tag_id = ?');
+  const stmt = prepare('DELETE FROM file_tags WHERE file_id = ? AND tag_id = ?');
   return stmt.run(fileId, tagId);
 }
 
 export function getFilesByTag(tagId: string) {
-  const stmt = db.prepare(`
+  const stmt = prepare(`
     SELECT f.*
     FROM files f
     JOIN file_tags ft ON f.id = ft.file_id
@@ -340,7 +660,7 @@ export function getFilesByTag(tagId: string) {
 }
 
 export function getTagsByFile(fileId: string) {
-  const stmt = db.prepare(`
+  const stmt = prepare(`
     SELECT t.*
     FROM tags t
     JOIN file_tags ft ON t.id = ft.tag_id
@@ -353,7 +673,7 @@ export function getTagsByFile(fileId: string) {
 
 // Chat functions
 export function createChatSession(data: { title: string; userId?: string }) {
-  const stmt = db.prepare(`
+  const stmt = prepare(`
     INSERT INTO chat_sessions (id, title, user_id, created_at, updated_at)
     VALUES (?, ?, ?, unixepoch(), unixepoch())
   `);
@@ -365,23 +685,23 @@ export function createChatSession(data: { title: string; userId?: string }) {
 }
 
 export function getChatSessionById(id: string) {
-  const stmt = db.prepare('SELECT * FROM chat_sessions WHERE id = ?');
+  const stmt = prepare('SELECT * FROM chat_sessions WHERE id = ?');
   return stmt.get(id);
 }
 
 export function getAllChatSessions(userId?: string) {
   let stmt;
   if (userId) {
-    stmt = db.prepare('SELECT * FROM chat_sessions WHERE user_id = ? ORDER BY updated_at DESC');
+    stmt = prepare('SELECT * FROM chat_sessions WHERE user_id = ? ORDER BY updated_at DESC');
     return stmt.all(userId);
   } else {
-    stmt = db.prepare('SELECT * FROM chat_sessions ORDER BY updated_at DESC');
+    stmt = prepare('SELECT * FROM chat_sessions ORDER BY updated_at DESC');
     return stmt.all();
   }
 }
 
 export function updateChatSession(id: string, data: { title: string }) {
-  const stmt = db.prepare(`
+  const stmt = prepare(`
     UPDATE chat_sessions
     SET title = ?, updated_at = unixepoch()
     WHERE id = ?
@@ -393,7 +713,7 @@ export function updateChatSession(id: string, data: { title: string }) {
 }
 
 export function deleteChatSession(id: string) {
-  const stmt = db.prepare('DELETE FROM chat_sessions WHERE id = ?');
+  const stmt = prepare('DELETE FROM chat_sessions WHERE id = ?');
   return stmt.run(id);
 }
 
@@ -402,7 +722,7 @@ export function addMessageToChat(data: {
   role: 'user' | 'assistant' | 'system'; 
   content: string 
 }) {
-  const stmt = db.prepare(`
+  const stmt = prepare(`
     INSERT INTO chat_messages (id, session_id, role, content, created_at)
     VALUES (?, ?, ?, ?, unixepoch())
   `);
@@ -411,7 +731,7 @@ export function addMessageToChat(data: {
   stmt.run(id, data.sessionId, data.role, data.content);
   
   // Update the chat session's updated_at timestamp
-  const updateStmt = db.prepare(`
+  const updateStmt = prepare(`
     UPDATE chat_sessions
     SET updated_at = unixepoch()
     WHERE id = ?
@@ -422,12 +742,12 @@ export function addMessageToChat(data: {
 }
 
 export function getMessageById(id: string) {
-  const stmt = db.prepare('SELECT * FROM chat_messages WHERE id = ?');
+  const stmt = prepare('SELECT * FROM chat_messages WHERE id = ?');
   return stmt.get(id);
 }
 
 export function getChatMessages(sessionId: string) {
-  const stmt = db.prepare(`
+  const stmt = prepare(`
     SELECT * FROM chat_messages
     WHERE session_id = ?
     ORDER BY created_at
@@ -437,7 +757,7 @@ export function getChatMessages(sessionId: string) {
 }
 
 export function addFileToChat(sessionId: string, fileId: string) {
-  const stmt = db.prepare(`
+  const stmt = prepare(`
     INSERT OR IGNORE INTO chat_session_files (session_id, file_id, created_at)
     VALUES (?, ?, unixepoch())
   `);
@@ -446,12 +766,12 @@ export function addFileToChat(sessionId: string, fileId: string) {
 }
 
 export function removeFileFromChat(sessionId: string, fileId: string) {
-  const stmt = db.prepare('DELETE FROM chat_session_files WHERE session_id = ? AND file_id = ?');
+  const stmt = prepare('DELETE FROM chat_session_files WHERE session_id = ? AND file_id = ?');
   return stmt.run(sessionId, fileId);
 }
 
 export function getChatFiles(sessionId: string) {
-  const stmt = db.prepare(`
+  const stmt = prepare(`
     SELECT f.*
     FROM files f
     JOIN chat_session_files csf ON f.id = csf.file_id
@@ -487,6 +807,24 @@ export type PdfMetadata = {
 };
 
 // PDF metadata functions
+// Writable pdf_metadata columns (besides file_id), keyed by their camelCase field names
+const PDF_METADATA_COLUMNS: Record<string, string> = {
+  title: 'title',
+  author: 'author',
+  subject: 'subject',
+  keywords: 'keywords',
+  creator: 'creator',
+  producer: 'producer',
+  pageCount: 'page_count',
+  creationDate: 'creation_date',
+  modificationDate: 'modification_date',
+  summary: 'summary',
+  documentType: 'document_type',
+  topics: 'topics',
+  aiEnhanced: 'ai_enhanced',
+  needsReview: 'needs_review',
+};
+
 export function savePdfMetadata(data: {
   fileId: string;
   title?: string;
@@ -514,68 +852,71 @@ export function savePdfMetadata(data: {
     needsReview: data.needsReview !== undefined ? (data.needsReview ? 1 : 0) : undefined
   };
   
+  const { columns, values } = pickColumns(sqliteData, PDF_METADATA_COLUMNS);
+  
   if (existing) {
     // Update existing metadata
-    const updates = Object.entries(sqliteData)
-      .filter(([key, _]) => key !== 'fileId') // Exclude fileId from updates
-      .filter(([_, value]) => value !== undefined)
-      .map(([key, _]) => {
-        // Convert camelCase to snake_case
-        return `${key.replace(/([A-Z])/g, '_$1').toLowerCase()} = ?`;
-      });
-    
-    if (updates.length === 0) return existing;
+    if (columns.length === 0) return existing;
     
     const sql = `
       UPDATE pdf_metadata
-      SET ${updates.join(', ')}, updated_at = unixepoch()
+      SET ${columns.map(column => `${column} = ?`).join(', ')}, updated_at = unixepoch()
       WHERE file_id = ?
     `;
     
-    const stmt = db.prepare(sql);
-    const values = [
-      ...Object.entries(sqliteData)
-        .filter(([key, _]) => key !== 'fileId')
-        .filter(([_, value]) => value !== undefined)
-        .map(([_, value]) => value),
-      data.fileId
-    ];
-    
-    stmt.run(...values);
+    const stmt = prepare(sql);
+    stmt.run(...values, data.fileId);
   } else {
     // Insert new metadata
-    const columns = ['file_id', ...Object.keys(sqliteData)
-      .filter(key => key !== 'fileId' && sqliteData[key as keyof typeof sqliteData] !== undefined)
-      .map(key => key.replace(/([A-Z])/g, '_$1').toLowerCase())
-    ];
-    
-    const placeholders = columns.map(() => '?').join(', ');
+    const placeholders = ['?', ...columns.map(() => '?')].join(', ');
     
     const sql = `
-      INSERT INTO pdf_metadata (${columns.join(', ')}, created_at, updated_at)
+      INSERT INTO pdf_metadata (file_id, ${[...columns, 'created_at', 'updated_at'].join(', ')})
       VALUES (${placeholders}, unixepoch(), unixepoch())
     `;
     
-    const stmt = db.prepare(sql);
-    const values = [
-      data.fileId,
-      ...Object.entries(sqliteData)
-        .filter(([key, _]) => key !== 'fileId')
-        .filter(([_, value]) => value !== undefined)
-        .map(([_, value]) => value)
-    ];
-    
-    stmt.run(...values);
+    const stmt = prepare(sql);
+    stmt.run(data.fileId, ...values);
   }
   
+  invalidateFileCaches(data.fileId);
   return getPdfMetadata(data.fileId);
 }
 
 export function getPdfMetadata(fileId: string): PdfMetadata | undefined {
-  const stmt = db.prepare('SELECT * FROM pdf_metadata WHERE file_id = ?');
+  const stmt = prepare('SELECT * FROM pdf_metadata WHERE file_id = ?');
   return stmt.get(fileId) as PdfMetadata | undefined;
 }
 
+/**
+ * Fetches a file together with its PDF metadata in a single query
+ */
+export function getFileWithMetadata(id: string): { file: FileRecord; metadata: PdfMetadata | null } | undefined {
+  const cached = fileDetailCache.get(id);
+  if (cached) return cached;
+
+  // expand() nests each row's columns under the name of the table they come
+  // from, not the alias used in the query: { files: {...}, pdf_metadata: {...} }
+  const stmt = prepare(`
+    SELECT f.*, m.*
+    FROM files f
+    LEFT JOIN pdf_metadata m ON m.file_id = f.id
+    WHERE f.id = ?
+  `).expand(true);
+
+  const row = stmt.get(id) as { files: FileRecord; pdf_metadata: PdfMetadata } | undefined;
+  if (!row) return undefined;
+
+  const result = {
+    file: row.files,
+    // A file without metadata comes back with every metadata column NULL
+    metadata: row.pdf_metadata.file_id ? row.pdf_metadata : null
+  };
+
+  fileDetailCache.set(id, result);
+  return result;
+}
+
 // Document chunk functions
 export interface DocumentChunk {
   id: string;
@@ -589,7 +930,7 @@ export interface DocumentChunk {
   createdAt: number;
 }
 
-export function saveDocumentChunk(data: {
+export type NewDocumentChunk = {
   documentId: string;
   pageNumber: number;
   chunkIndex: number;
@@ -597,11 +938,13 @@ export function saveDocumentChunk(data: {
   contentType?: string;
   tokenCount?: number;
   importance?: number;
-}): DocumentChunk {
+};
+
+export function saveDocumentChunk(data: NewDocumentChunk): DocumentChunk {
   const id = uuidv4();
   const now = Math.floor(Date.now() / 1000);
   
-  const stmt = db.prepare(`
+  const stmt = prepare(`
     INSERT INTO document_chunks (
       id, document_id, page_number, chunk_index, 
       content, content_type, token_count, importance, created_at
@@ -633,6 +976,56 @@ export function saveDocumentChunk(data: {
   };
 }
 
+// Rows per multi-row INSERT when saving chunks; 100 rows x 9 columns stays
+// well under SQLite's bound-parameter limit
+const CHUNK_INSERT_BATCH_SIZE = 100;
+
+function chunkInsertStatement(rowCount: number) {
+  const rowPlaceholders = '(?, ?, ?, ?, ?, ?, ?, ?, ?)';
+  return prepare(`
+    INSERT INTO document_chunks (
+      id, document_id, page_number, chunk_index, 
+      content, content_type, token_count, importance, created_at
+    ) VALUES ${Array(rowCount).fill(rowPlaceholders).join(', ')}
+  `);
+}
+
+/**
+ * Saves all chunks of a document inside a single transaction, inserting up to
+ * CHUNK_INSERT_BATCH_SIZE rows per statement, so a large document costs a
+ * handful of statements and one commit instead of one of each per chunk
+ */
+export function saveDocumentChunks(chunks: NewDocumentChunk[]): number {
+  const now = Math.floor(Date.now() / 1000);
+  
+  const insertAll = db.transaction((rows: NewDocumentChunk[]) => {
+    for (let start = 0; start < rows.length; start += CHUNK_INSERT_BATCH_SIZE) {
+      const batch = rows.slice(start, start + CHUNK_INSERT_BATCH_SIZE);
+      const values: unknown[] = [];
+      
+      for (const data of batch) {
+        values.push(
+          uuidv4(),
+          data.documentId,
+          data.pageNumber,
+          data.chunkIndex,
+          data.content,
+          data.contentType || 'text',
+          data.tokenCount || 0,
+          data.importance || 0.5,
+          now
+        );
+      }
+      
+      // Full batches share one cached statement; only the last batch differs
+      chunkInsertStatement(batch.length).run(...values);
+    }
+  });
+  
+  insertAll(chunks);
+  return chunks.length;
+}
+
 // Settings type
 export interface Setting {
   id: string;
@@ -650,7 +1043,7 @@ export function saveSetting(data: { userId?: string; key: string; value: string
   
   if (existing) {
     // Update existing setting
-    const stmt = db.prepare(`
+    const stmt = prepare(`
       UPDATE settings
       SET value = ?, updated_at = unixepoch()
       WHERE id = ?
@@ -660,7 +1053,7 @@ export function saveSetting(data: { userId?: string; key: string; value: string
     return getSettingById(existing.id) as Setting;
   } else {
     // Insert new setting
-    const stmt = db.prepare(`
+    const stmt = prepare(`
       INSERT INTO settings (id, user_id, key, value, created_at, updated_at)
       VALUES (?, ?, ?, ?, unixepoch(), unixepoch())
     `);
@@ -672,17 +1065,17 @@ export function saveSetting(data: { userId?: string; key: string; value: string
 }
 
 export function getSettingById(id: string): Setting | undefined {
-  const stmt = db.prepare('SELECT * FROM settings WHERE id = ?');
+  const stmt = prepare('SELECT * FROM settings WHERE id = ?');
   return stmt.get(id) as Setting | undefined;
 }
 
 export function getSetting(key: string, userId?: string): Setting | undefined {
   let stmt;
   if (userId) {
-    stmt = db.prepare('SELECT * FROM settings WHERE key = ? AND user_id = ?');
+    stmt = prepare('SELECT * FROM settings WHERE key = ? AND user_id = ?');
     return stmt.get(key, userId) as Setting | undefined;
   } else {
-    stmt = db.prepare('SELECT * FROM settings WHERE key = ? AND user_id IS NULL');
+    stmt = prepare('SELECT * FROM settings WHERE key = ? AND user_id IS NULL');
     return stmt.get(key) as Setting | undefined;
   }
 }
@@ -690,16 +1083,16 @@ export function getSetting(key: string, userId?: string): Setting | undefined {
 export function getAllSettings(userId?: string) {
   let stmt;
   if (userId) {
-    stmt = db.prepare('SELECT * FROM settings WHERE user_id = ?');
+    stmt = prepare('SELECT * FROM settings WHERE user_id = ?');
     return stmt.all(userId);
   } else {
-    stmt = db.prepare('SELECT * FROM settings WHERE user_id IS NULL');
+    stmt = prepare('SELECT * FROM settings WHERE user_id IS NULL');
     return stmt.all();
   }
 }
 
 export function deleteSetting(id: string) {
-  const stmt = db.prepare('DELETE FROM settings WHERE id = ?');
+  const stmt = prepare('DELETE FROM settings WHERE id = ?');
   return stmt.run(id);
 }
 
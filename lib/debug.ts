@@ -0,0 +1,15 @@
+// Verbose payload logging is off unless PDVERSE_DEBUG=true
+export const DEBUG_LOGGING = process.env.PDVERSE_DEBUG === 'true';
+
+/**
+ * Logs a debug message when debug logging is on. Pass expensive details as a
+ * function so they are only built (stringified, copied) when actually logged.
+ */
+export function debugLog(message: string, details?: () => unknown) {
+  if (!DEBUG_LOGGING) return;
+  if (details) {
+    console.log(message, details());
+  } else {
+    console.log(message);
+  }
+}
@@ -0,0 +1,17 @@
+// lib/pdf/extract-worker.mjs
+import { parentPort } from 'worker_threads';
+import { extractPdfMetadata } from './mupdf-parser.mjs';
+
+/**
+ * Worker thread entry point: stays alive and parses one PDF per message,
+ * posting either the extraction result or the error message back to the
+ * main thread. MuPDF is loaded once per worker rather than once per file.
+ */
+parentPort.on('message', async ({ filePath }) => {
+  try {
+    const result = await extractPdfMetadata(filePath);
+    parentPort.postMessage({ result });
+  } catch (error) {
+    parentPort.postMessage({ error: error instanceof Error ? error.message : String(error) });
+  }
+});
@@ -0,0 +1,101 @@
+import { Worker } from 'worker_threads';
+import fs from 'fs';
+import os from 'os';
+import path from 'path';
+import { PdfExtractionResult } from './types';
+import { TtlCache } from '../cache';
+import { Semaphore } from '../semaphore';
+
+// The worker is loaded from disk at runtime rather than bundled, so resolve it from the project root
+const EXTRACT_WORKER_PATH = path.join(process.cwd(), 'lib', 'pdf', 'extract-worker.mjs');
+
+// Never run more parses at once than there are cores to run them on
+const MAX_CONCURRENT_EXTRACTIONS = Math.max(1, os.cpus().length);
+
+// Recent extraction results, keyed by file identity so a re-processed or
+// re-enhanced PDF isn't parsed again. Storing the promise lets concurrent
+// requests for the same file share one parse.
+const extractionCache = new TtlCache<string, Promise<PdfExtractionResult>>(32, 10 * 60 * 1000);
+
+const extractionSlots = new Semaphore(MAX_CONCURRENT_EXTRACTIONS);
+
+// Workers that have finished a job and are waiting for the next one. At most
+// MAX_CONCURRENT_EXTRACTIONS workers exist, since each job holds a slot.
+const idleWorkers: Worker[] = [];
+
+type WorkerReply = { result: PdfExtractionResult } | { error: string };
+
+function spawnWorker(): Worker {
+  const worker = new Worker(EXTRACT_WORKER_PATH);
+  // Never hand out a worker that died while it was idle
+  worker.on('exit', () => {
+    const index = idleWorkers.indexOf(worker);
+    if (index !== -1) idleWorkers.splice(index, 1);
+  });
+  return worker;
+}
+
+function runExtractionWorker(filePath: string): Promise<PdfExtractionResult> {
+  const worker = idleWorkers.pop() || spawnWorker();
+
+  return new Promise((resolve, reject) => {
+    const cleanup = () => {
+      worker.off('message', onMessage);
+      worker.off('error', onError);
+      worker.off('exit', onExit);
+    };
+    const onMessage = (reply: WorkerReply) => {
+      cleanup();
+      // Idle workers shouldn't keep the process alive on shutdown
+      worker.unref();
+      idleWorkers.push(worker);
+      if ('error' in reply) {
+        reject(new Error(reply.error));
+      } else {
+        resolve(reply.result);
+      }
+    };
+    const onError = (error: Error) => {
+      // A crashed worker is discarded; the next job starts a fresh one
+      cleanup();
+      worker.terminate();
+      reject(error);
+    };
+    const onExit = (code: number) => {
+      cleanup();
+      reject(new Error(`PDF extraction worker exited with code ${code}`));
+    };
+
+    worker.on('message', onMessage);
+    worker.on('error', onError);
+    worker.on('exit', onExit);
+    worker.ref();
+    worker.postMessage({ filePath });
+  });
+}
+
+/**
+ * Extracts metadata and text from a PDF in a worker thread, keeping the
+ * CPU-bound MuPDF parse off the server event loop
+ */
+export async function extractPdfInWorker(filePath: string): Promise<PdfExtractionResult> {
+  // Size and mtime change whenever the file is rewritten, which keeps stale
+  // results from being served for a replaced file
+  const stats = await fs.promises.stat(filePath);
+  const cacheKey = `${filePath}:${stats.size}:${stats.mtimeMs}`;
+
+  const cached = extractionCache.get(cacheKey);
+  if (cached) return cached;
+
+  const extraction = runQueuedExtraction(filePath);
+  extractionCache.set(cacheKey, extraction);
+
+  // Don't keep failures around; the next call should try again
+  extraction.catch(() => extractionCache.delete(cacheKey));
+
+  return extraction;
+}
+
+function runQueuedExtraction(filePath: string): Promise<PdfExtractionResult> {
+  return extractionSlots.run(() => runExtractionWorker(filePath));
+}
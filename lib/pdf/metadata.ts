@@ -0,0 +1,75 @@
+import type { PdfMetadata } from '../db';
+import { PdfMetadataExtraction } from './types';
+
+/**
+ * Parses stored topics. Rows are written as a comma-separated list; older
+ * rows may hold a JSON array instead.
+ */
+function parseTopics(topics: string | undefined): string[] {
+  if (!topics) return [];
+
+  if (topics.trim().startsWith('[')) {
+    try {
+      const parsed = JSON.parse(topics);
+      if (Array.isArray(parsed)) return parsed.map(String);
+    } catch {
+      // Not JSON after all; fall through to the comma-separated form
+    }
+  }
+
+  return topics
+    .split(',')
+    .map(t => t.trim())
+    .filter(t => t);
+}
+
+/**
+ * Converts extracted (or AI-enhanced) metadata into the primitive values
+ * savePdfMetadata binds, so no object or array ever reaches SQLite
+ */
+export function toPdfMetadataRecord(fileId: string, metadata: PdfMetadataExtraction) {
+  return {
+    fileId,
+    title: String(metadata.title || ''),
+    author: String(metadata.author || ''),
+    subject: String(metadata.subject || ''),
+    keywords: String(metadata.keywords || ''),
+    creator: String(metadata.creator || ''),
+    producer: String(metadata.producer || ''),
+    pageCount: Number(metadata.pageCount || 0),
+    creationDate: String(metadata.creationDate || ''),
+    modificationDate: String(metadata.modificationDate || ''),
+    summary: String(metadata.summary || ''),
+    documentType: String(metadata.documentType || ''),
+    // Stored as the comma-separated list the file detail page displays
+    topics: Array.isArray(metadata.topics)
+      ? metadata.topics.join(', ')
+      : String(metadata.topics || ''),
+    // savePdfMetadata converts these to SQLite integers
+    aiEnhanced: Boolean(metadata.aiEnhanced),
+    needsReview: Boolean(metadata.needsReview)
+  };
+}
+
+/**
+ * Converts a stored pdf_metadata row back into the shape used for extraction
+ * and enhancement
+ */
+export function fromPdfMetadataRecord(row: PdfMetadata): PdfMetadataExtraction {
+  return {
+    title: row.title || '',
+    author: row.author || '',
+    subject: row.subject || '',
+    keywords: row.keywords || '',
+    creator: row.creator || '',
+    producer: row.producer || '',
+    pageCount: row.page_count || 0,
+    creationDate: row.creation_date || '',
+    modificationDate: row.modification_date || '',
+    summary: row.summary || '',
+    documentType: row.document_type || '',
+    topics: parseTopics(row.topics),
+    aiEnhanced: Boolean(row.ai_enhanced),
+    needsReview: Boolean(row.needs_review)
+  };
+}
@@ -51,8 +51,9 @@ export async function extractPdfMetadata(filePath) {
       console.warn('Error extracting PDF metadata:', error);
     }
     
-    // Extract text content
-    let fullText = '';
+    // Extract text content. Pieces are collected in arrays and joined once,
+    // since appending to a growing string copies it again and again on
+    // large documents
     const pageTexts = [];
     
     try {
@@ -62,24 +63,23 @@ export async function extractPdfMetadata(filePath) {
         
         // Get the text content using structured text
         const structuredText = page.toStructuredText("preserve-whitespace");
-        const textJson = structuredText.asJSON();
+        const textJson = JSON.parse(structuredText.asJSON());
         
         // Extract text from the structured JSON
-        let pageText = '';
+        const lineTexts = [];
         if (textJson && textJson.blocks) {
           for (const block of textJson.blocks) {
             if (block.type === 'text' && block.lines) {
               for (const line of block.lines) {
                 if (line.text) {
-                  pageText += line.text + ' ';
+                  lineTexts.push(line.text + ' ');
                 }
               }
             }
           }
         }
         
-        pageTexts.push(pageText);
-        fullText += pageText + ' ';
+        pageTexts.push(lineTexts.join(''));
         
         // Close the page after we're done with it
         // Some versions of MuPDF don't have a page.close() method
@@ -100,6 +100,8 @@ export async function extractPdfMetadata(filePath) {
       }
     }
     
+    const fullText = pageTexts.map(pageText => pageText + ' ').join('');
+    
     console.log(`Extracted metadata from PDF with ${metadata.pageCount} pages`);
     
     return { metadata, fullText, pageTexts };
@@ -0,0 +1,37 @@
+/**
+ * Limits how many async tasks run at once. Tasks beyond the limit wait in
+ * FIFO order for a running one to finish.
+ */
+export class Semaphore {
+  private active = 0;
+  private waiting: Array<() => void> = [];
+
+  constructor(private limit: number) {}
+
+  acquire(): Promise<void> {
+    if (this.active < this.limit) {
+      this.active++;
+      return Promise.resolve();
+    }
+    return new Promise(resolve => this.waiting.push(resolve));
+  }
+
+  release() {
+    const next = this.waiting.shift();
+    if (next) {
+      // Hand the slot straight to the next waiting task
+      next();
+    } else {
+      this.active--;
+    }
+  }
+
+  async run<T>(task: () => Promise<T>): Promise<T> {
+    await this.acquire();
+    try {
+      return await task();
+    } finally {
+      this.release();
+    }
+  }
+}
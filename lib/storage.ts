@@ -0,0 +1,78 @@
+import crypto from 'crypto';
+import fs from 'fs';
+import path from 'path';
+import { Readable } from 'stream';
+import { pipeline } from 'stream/promises';
+import type { ReadableStream as NodeReadableStream } from 'stream/web';
+
+// Ensure uploads directory exists
+export const UPLOADS_DIR = path.join(process.cwd(), 'uploads');
+if (!fs.existsSync(UPLOADS_DIR)) {
+  fs.mkdirSync(UPLOADS_DIR, { recursive: true });
+}
+
+// Every PDF starts with this header
+const PDF_MAGIC = Buffer.from('%PDF-');
+
+/**
+ * Thrown when an upload's content is not a PDF
+ */
+export class InvalidPdfError extends Error {
+  constructor() {
+    super('File content is not a PDF');
+    this.name = 'InvalidPdfError';
+    // Keep instanceof working when compiled down to ES5
+    Object.setPrototypeOf(this, InvalidPdfError.prototype);
+  }
+}
+
+/**
+ * Streams an uploaded file to disk chunk by chunk, so the write never blocks
+ * the event loop and no second in-memory copy of the file is made.
+ * Returns the hex SHA-256 and byte size of the content, computed as the
+ * chunks go by. Rejects with InvalidPdfError as soon as the first bytes show
+ * the content is not a PDF, without reading the rest of the upload.
+ */
+export async function saveUploadedFile(
+  stream: ReadableStream<Uint8Array>,
+  filePath: string
+): Promise<{ contentHash: string; size: number }> {
+  const hash = crypto.createHash('sha256');
+  let size = 0;
+  let head = Buffer.alloc(0);
+
+  try {
+    await pipeline(
+      Readable.fromWeb(stream as unknown as NodeReadableStream<Uint8Array>),
+      async function* (source: AsyncIterable<Uint8Array>) {
+        for await (const chunk of source) {
+          // Check the header once enough bytes have arrived
+          if (head.length < PDF_MAGIC.length) {
+            head = Buffer.concat([head, chunk]);
+            if (
+              head.length >= PDF_MAGIC.length &&
+              !head.subarray(0, PDF_MAGIC.length).equals(PDF_MAGIC)
+            ) {
+              throw new InvalidPdfError();
+            }
+          }
+          hash.update(chunk);
+          size += chunk.byteLength;
+          yield chunk;
+        }
+      },
+      fs.createWriteStream(filePath)
+    );
+
+    // Too short to even hold the header
+    if (head.length < PDF_MAGIC.length) {
+      throw new InvalidPdfError();
+    }
+  } catch (error) {
+    // Don't leave a truncated file behind when the upload is aborted
+    await fs.promises.rm(filePath, { force: true });
+    throw error;
+  }
+
+  return { contentHash: hash.digest('hex'), size };
+}
@@ -1,6 +1,29 @@
+// The API is same-origin by default. Set ALLOWED_ORIGIN to let one other
+// origin (e.g. a separately hosted frontend) call it; never a wildcard.
+const ALLOWED_ORIGIN = process.env.ALLOWED_ORIGIN;
+
 /** @type {import('next').NextConfig} */
 const nextConfig = {
   reactStrictMode: true,
+  // Gzip JSON and page responses. Routes that send already-compressed data
+  // (PDFs) or streams opt out with Cache-Control: no-transform.
+  compress: true,
+  // CORS headers are fixed at startup, so nothing is matched per request
+  async headers() {
+    if (!ALLOWED_ORIGIN) return [];
+    return [
+      {
+        source: '/api/:path*',
+        headers: [
+          { key: 'Access-Control-Allow-Origin', value: ALLOWED_ORIGIN },
+          { key: 'Access-Control-Allow-Credentials', value: 'true' },
+          { key: 'Access-Control-Allow-Methods', value: 'GET, POST, DELETE' },
+          { key: 'Access-Control-Allow-Headers', value: 'Authorization, Content-Type, X-Filename' },
+          { key: 'Vary', value: 'Origin' },
+        ],
+      },
+    ];
+  },
   images: {
     domains: ['localhost'],
   },
@@ -38,6 +61,8 @@ const nextConfig = {
   // Add experimental serverComponentsExternalPackages for MuPDF
   experimental: {
     serverComponentsExternalPackages: ['mupdf'],
+    // Run instrumentation.ts at startup to warm up the database and MuPDF
+    instrumentationHook: true,
   },
 };
 